@@ -0,0 +1,250 @@
+"""
+Benchmark of the tab callbacks of the dashboard
+
+Times every `show_*` callback end to end at small, default and large ranges,
+with the time split between the grid computation, the chart (`to_html()` of
+the Altair chart or the Plotly figure JSON) and the table (`build_table` or
+the DataTable page), and stores the results as JSON:
+
+    python benchmarks/bench_callbacks.py
+    python benchmarks/bench_callbacks.py --repeat 10 --output before.json
+    python benchmarks/bench_callbacks.py --compare before.json after.json
+
+The rendering modes follow `EXTRUCAL_CHART_MODE` and `EXTRUCAL_TABLE_MODE`.
+The grid budget of the tabs is raised to `GRID_MAX_CELLS` unless
+`EXTRUCAL_GRID_MAX_CELLS` is set, so that the callbacks compute the requested
+grids; a case whose callback is rejected or reduced by the grid policy is
+reported as an error.
+The result cache is cleared before every timed call, except for the
+"callback_cached" timing (second call of the callback with the same inputs).
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SRC = os.path.join(os.path.dirname(HERE), "src")
+
+# Range overrides of each size, by input name (without the tab prefix)
+SIZES = {
+    "throughput": {
+        "small": {"max_rpm": 20},
+        "default": {},
+        "large": {"max_rpm": 200, "delta_rpm": 0.5},
+    },
+    "rpm": {
+        "small": {"max_l_speed": 3, "max_size": 60},
+        "default": {},
+        "large": {
+            "max_l_speed": 50,
+            "delta_l_speed": 0.5,
+            "min_size": 20,
+            "max_size": 250,
+            "delta_size": 1,
+        },
+    },
+}
+
+STAGES = ["compute", "chart", "table", "callback", "callback_cached"]
+
+# Grid budget of the tabs during the benchmark, above every case of `SIZES`
+GRID_MAX_CELLS = 1_000_000
+
+
+def load_app():
+    """
+    Imports the app without pre-rendering, background jobs or report, with
+    the grid budget of the benchmark
+    """
+    os.environ["EXTRUCAL_PRERENDER"] = "0"
+    os.environ["EXTRUCAL_BACKGROUND"] = "0"
+    os.environ["EXTRUCAL_STARTUP_REPORT"] = "0"
+    os.environ.setdefault("EXTRUCAL_GRID_MAX_CELLS", str(GRID_MAX_CELLS))
+    sys.path.insert(0, SRC)
+    import app
+
+    return app
+
+
+def inputs(app, tab, size):
+    """Callback arguments of a tab for one of the `SIZES`"""
+    overrides = SIZES["throughput" if tab == "throughput" else "rpm"][size]
+    params = []
+    for id, value in zip(app.TAB_INPUTS[tab], app.default_inputs(tab)):
+        name = id.removeprefix(f"{tab}_")
+        params.append(overrides.get(name, value))
+    return params
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - start, result
+
+
+def run_case(app, tab, params, repeat):
+    """
+    Timings [s] of each stage of a tab callback, `repeat` times after a
+    warm-up run (which also imports the lazily loaded modules)
+    """
+    import charts
+
+    paging = app.default_paging(tab)
+    # Ranges of the chart, in the order of the `*_output` arguments
+    ranges = [
+        params[i]
+        for r in app.TAB_RANGES[tab]
+        for i in (r.min_index, r.max_index, r.delta_index)
+    ]
+    chart_output = (
+        charts.throughput_output if tab == "throughput" else charts.rpm_output
+    )
+
+    timings = {stage: [] for stage in STAGES}
+    for _ in range(repeat + 1):
+        app.results.clear()
+        elapsed, table = timed(app.TAB_GRIDS[tab], *params)
+        timings["compute"].append(elapsed)
+        elapsed, chart = timed(chart_output, table, *ranges, app.CHART_MODE)
+        timings["chart"].append(elapsed)
+        elapsed, _ = timed(app.table_output, table, *paging)
+        timings["table"].append(elapsed)
+
+        app.results.clear()
+        args = [tab, *params, *paging] + ([None] if tab in app.INCREMENTAL_TABS else [])
+        elapsed, outputs = timed(app.TAB_CALLBACKS[tab], *args)
+        # The last output is the notice of the grid policy
+        if outputs[-1]:
+            raise RuntimeError(f"grid policy: {outputs[-1]}")
+        timings["callback"].append(elapsed)
+        elapsed, _ = timed(app.TAB_CALLBACKS[tab], *args)
+        timings["callback_cached"].append(elapsed)
+
+    timings = {stage: values[1:] for stage, values in timings.items()}
+    return {
+        "cells": int(table.size),
+        "output_bytes": len(json.dumps(outputs, default=str)),
+        **{
+            stage: {
+                "median": statistics.median(values),
+                "min": min(values),
+            }
+            for stage, values in timings.items()
+        },
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=HERE,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(tabs, sizes, repeat):
+    app = load_app()
+    results = []
+    for tab in tabs:
+        for size in sizes:
+            params = inputs(app, tab, size)
+            case = {"tab": tab, "size": size, "params": params}
+            try:
+                case.update(run_case(app, tab, params, repeat))
+            except Exception as e:
+                case["error"] = f"{type(e).__name__}: {e}"
+            results.append(case)
+            print(format_case(case), flush=True)
+    return {
+        "meta": {
+            "date": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "machine": platform.platform(),
+            "chart_mode": app.CHART_MODE,
+            "table_mode": app.TABLE_MODE,
+            "repeat": repeat,
+        },
+        "results": results,
+    }
+
+
+def format_case(case):
+    label = f"{case['tab']:<11}{case['size']:<8}"
+    if "error" in case:
+        return f"{label}ERROR {case['error'].splitlines()[0][:100]}"
+    stages = "  ".join(
+        f"{stage} {case[stage]['median'] * 1000:8.1f}ms" for stage in STAGES
+    )
+    return f"{label}{case['cells']:>7,} cells  {stages}"
+
+
+def compare(before, after):
+    """Prints the median of each stage of two runs and their ratio"""
+    old = {(c["tab"], c["size"]): c for c in before["results"]}
+    print(f"{'':19}" + "".join(f"{stage:>26}" for stage in STAGES))
+    for case in after["results"]:
+        base = old.get((case["tab"], case["size"]))
+        line = f"{case['tab']:<11}{case['size']:<8}"
+        for stage in STAGES:
+            if base is None or stage not in base or stage not in case:
+                line += f"{'-':>26}"
+                continue
+            a, b = base[stage]["median"] * 1000, case[stage]["median"] * 1000
+            line += f"{a:9.1f} ->{b:9.1f}ms x{b / a if a else float('nan'):4.2f}"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--tabs",
+        nargs="+",
+        default=["throughput", "cable", "tube", "rod", "sheet"],
+    )
+    parser.add_argument("--sizes", nargs="+", default=["small", "default", "large"])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument(
+        "--output",
+        help="JSON file of the results "
+        "(default: benchmarks/results/callbacks-<date>.json)",
+    )
+    parser.add_argument(
+        "--compare",
+        nargs=2,
+        metavar=("BEFORE", "AFTER"),
+        help="compare two result files instead of running the benchmark",
+    )
+    args = parser.parse_args()
+
+    if args.compare:
+        with open(args.compare[0]) as f, open(args.compare[1]) as g:
+            compare(json.load(f), json.load(g))
+        return
+
+    report = run(args.tabs, args.sizes, args.repeat)
+    output = args.output or os.path.join(
+        HERE,
+        "results",
+        f"callbacks-{datetime.now():%Y%m%d-%H%M%S}.json",
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
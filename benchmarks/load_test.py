@@ -0,0 +1,361 @@
+"""
+Load test of the dashboard replaying Dash callback traffic
+
+Starts the app under gunicorn (or targets a running server with `--url`) and
+replays `/_dash-update-component` requests from concurrent virtual users. The
+callbacks and input ids are read from the server (`/_dash-layout` and
+`/_dash-dependencies`), and each user repeatedly:
+
+- loads the page (every callback fired with the default inputs),
+- switches to another tab, or
+- edits a random numeric input of the selected tab.
+
+The report gives the throughput and the p50/p95/p99 latency of each callback:
+
+    python benchmarks/load_test.py --users 8 --duration 30 --workers 2
+    python benchmarks/load_test.py --url http://127.0.0.1:8050 --output load.json
+
+The `EXTRUCAL_*` variables of the environment are passed to gunicorn.
+Background callbacks (`EXTRUCAL_BACKGROUND=1`) are polled until their result is
+ready, and their latency includes the polling; they require a shared result
+cache (`EXTRUCAL_CACHE_BACKEND=disk` or `redis`).
+"""
+
+import argparse
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SRC = os.path.join(os.path.dirname(HERE), "src")
+
+# Share of each action of the virtual users
+ACTIONS = {"load": 0.2, "switch": 0.3, "edit": 0.5}
+
+# Factors applied to a numeric input by an edit
+EDIT_FACTORS = [0.5, 0.8, 0.9, 1.1, 1.25, 2]
+
+# Interval between two polls of a background callback [s]
+POLL_INTERVAL = 0.05
+
+
+# Server
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(port, workers, threads, timeout=120):
+    """Starts gunicorn as in the Procfile and waits until it answers"""
+    command = [
+        sys.executable,
+        "-m",
+        "gunicorn",
+        "--chdir",
+        SRC,
+        "--preload",
+        "--workers",
+        str(workers),
+        "--threads",
+        str(threads),
+        "--bind",
+        f"127.0.0.1:{port}",
+        "--log-level",
+        "warning",
+        "app:server",
+    ]
+    server = subprocess.Popen(command)
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"gunicorn exited with code {server.returncode}")
+        try:
+            urllib.request.urlopen(url + "/_dash-layout", timeout=5).read()
+            return server, url
+        except (urllib.error.URLError, ConnectionError):
+            time.sleep(0.5)
+    server.terminate()
+    raise RuntimeError("gunicorn didn't start in time")
+
+
+def get_json(url):
+    with urllib.request.urlopen(url, timeout=30) as response:
+        return json.load(response)
+
+
+# Layout and callbacks
+def walk(component):
+    """Yields the components of a layout in its JSON form"""
+    if isinstance(component, list):
+        for child in component:
+            yield from walk(child)
+    elif isinstance(component, dict) and "props" in component:
+        yield component
+        yield from walk(component["props"].get("children"))
+
+
+class Callbacks:
+    """Callbacks of the server, and the initial values of their inputs"""
+
+    def __init__(self, url):
+        layout = get_json(url + "/_dash-layout")
+        self.dependencies = [
+            d
+            for d in get_json(url + "/_dash-dependencies")
+            if not d.get("clientside_function")
+        ]
+        self.values = {}
+        self.tabs = []
+        for component in walk(layout):
+            props = component["props"]
+            id = props.get("id")
+            if isinstance(id, str):
+                for prop, value in props.items():
+                    if prop not in ("id", "children", "style"):
+                        self.values[f"{id}.{prop}"] = value
+            if component.get("type") == "Tab" and "value" in props:
+                self.tabs.append(props["value"])
+
+        # Numeric inputs of each tab, for the edits
+        self.numeric = {tab: [] for tab in self.tabs}
+        for d in self.dependencies:
+            ids = [i["id"] for i in d["inputs"]]
+            if "tabs" not in ids:
+                continue
+            tab = next(
+                (t for t in self.tabs if d["output"].startswith(f"..{t}_")), None
+            )
+            for i in d["inputs"]:
+                value = self.values.get(f"{i['id']}.{i['property']}")
+                if (
+                    tab
+                    and isinstance(value, (int, float))
+                    and not isinstance(value, bool)
+                ):
+                    self.numeric[tab].append(f"{i['id']}.{i['property']}")
+
+    @staticmethod
+    def name(dependency):
+        """Short name of a callback: its first output"""
+        return dependency["output"].strip(".").split("...")[0]
+
+    def triggered_by(self, prop, initial=False):
+        """Callbacks fired by a change of `prop` (all of them on page load)"""
+        if initial:
+            return [d for d in self.dependencies if not d.get("prevent_initial_call")]
+        return [
+            d
+            for d in self.dependencies
+            if any(f"{i['id']}.{i['property']}" == prop for i in d["inputs"])
+        ]
+
+    @staticmethod
+    def payload(dependency, values, changed):
+        def props(items):
+            return [
+                dict(i, value=values.get(f"{i['id']}.{i['property']}")) for i in items
+            ]
+
+        output = dependency["output"]
+        if output.startswith(".."):
+            outputs = [
+                dict(zip(("id", "property"), o.split(".", 1)))
+                for o in output.strip(".").split("...")
+            ]
+        else:
+            outputs = dict(zip(("id", "property"), output.split(".", 1)))
+        return {
+            "output": output,
+            "outputs": outputs,
+            "inputs": props(dependency["inputs"]),
+            "state": props(dependency.get("state", [])),
+            "changedPropIds": changed,
+        }
+
+
+# Virtual users
+class Recorder:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = {}
+        self.statuses = {}
+
+    def add(self, name, latency, status):
+        with self.lock:
+            self.latencies.setdefault(name, []).append(latency)
+            counts = self.statuses.setdefault(name, {})
+            counts[status] = counts.get(status, 0) + 1
+
+
+def post(url, payload, query=""):
+    request = urllib.request.Request(
+        f"{url}/_dash-update-component{query}",
+        data=json.dumps(payload).encode(),
+        headers={"Content-Type": "application/json"},
+    )
+    try:
+        with urllib.request.urlopen(request, timeout=300) as response:
+            body = response.read()
+            return response.status, json.loads(body) if body else None
+    except urllib.error.HTTPError as e:
+        return e.code, None
+
+
+def fire(url, callbacks, recorder, dependency, values, changed):
+    payload = Callbacks.payload(dependency, values, changed)
+    start = time.perf_counter()
+    status, body = post(url, payload)
+    # Background callback: poll until the job is done
+    while status == 200 and body and "cacheKey" in body and "response" not in body:
+        query = "?" + urllib.parse.urlencode(
+            {"cacheKey": body["cacheKey"], "job": body["job"]}
+        )
+        time.sleep(POLL_INTERVAL)
+        status, polled = post(url, payload, query)
+        if polled and "response" in polled:
+            break
+    recorder.add(Callbacks.name(dependency), time.perf_counter() - start, status)
+
+
+def edit(value, rng):
+    edited = value * rng.choice(EDIT_FACTORS)
+    return round(edited) if isinstance(value, int) else round(edited, 3)
+
+
+def user(url, callbacks, recorder, stop, seed):
+    rng = random.Random(seed)
+    values = {}
+    while not stop.is_set():
+        action = rng.choices(list(ACTIONS), weights=list(ACTIONS.values()))[0]
+        if action == "load" or not values:
+            values = dict(callbacks.values)
+            for d in callbacks.triggered_by(None, initial=True):
+                fire(url, callbacks, recorder, d, values, [])
+        elif action == "switch":
+            tab = values.get("tabs.value")
+            values["tabs.value"] = rng.choice([t for t in callbacks.tabs if t != tab])
+            for d in callbacks.triggered_by("tabs.value"):
+                fire(url, callbacks, recorder, d, values, ["tabs.value"])
+        else:
+            editable = callbacks.numeric.get(values.get("tabs.value"))
+            if not editable:
+                continue
+            prop = rng.choice(editable)
+            # Edits start from the default, so that the ranges stay reasonable
+            values[prop] = edit(callbacks.values[prop], rng)
+            for d in callbacks.triggered_by(prop):
+                fire(url, callbacks, recorder, d, values, [prop])
+
+
+# Report
+def percentile(sorted_values, q):
+    index = min(int(round(q / 100 * (len(sorted_values) - 1))), len(sorted_values) - 1)
+    return sorted_values[index]
+
+
+def summarize(recorder, elapsed):
+    callbacks = {}
+    for name, latencies in sorted(recorder.latencies.items()):
+        latencies = sorted(latencies)
+        statuses = recorder.statuses[name]
+        callbacks[name] = {
+            "requests": len(latencies),
+            "updates": statuses.get(200, 0),
+            "no_update": statuses.get(204, 0),
+            "errors": sum(n for s, n in statuses.items() if s not in (200, 204)),
+            "throughput": len(latencies) / elapsed,
+            **{f"p{q}": percentile(latencies, q) * 1000 for q in (50, 95, 99)},
+        }
+    total = sum(c["requests"] for c in callbacks.values())
+    return {
+        "duration": elapsed,
+        "requests": total,
+        "throughput": total / elapsed,
+        "callbacks": callbacks,
+    }
+
+
+def print_summary(summary):
+    print(
+        f"{summary['requests']:,} requests in {summary['duration']:.1f}s "
+        f"({summary['throughput']:.1f} req/s)"
+    )
+    print(
+        f"{'callback':<24}{'requests':>9}{'204':>7}{'errors':>8}{'req/s':>8}"
+        f"{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+    )
+    for name, c in summary["callbacks"].items():
+        print(
+            f"{name:<24}{c['requests']:>9,}{c['no_update']:>7,}{c['errors']:>8,}"
+            f"{c['throughput']:>8.1f}{c['p50']:>9.1f}{c['p95']:>9.1f}{c['p99']:>9.1f}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--url", help="server to test instead of starting gunicorn")
+    parser.add_argument("--workers", type=int, default=1, help="gunicorn workers")
+    parser.add_argument("--threads", type=int, default=1, help="gunicorn threads")
+    parser.add_argument("--users", type=int, default=4, help="concurrent users")
+    parser.add_argument("--duration", type=float, default=30, help="duration [s]")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="JSON file of the results")
+    args = parser.parse_args()
+
+    server = None
+    url = args.url
+    if url is None:
+        server, url = start_server(free_port(), args.workers, args.threads)
+    try:
+        callbacks = Callbacks(url.rstrip("/"))
+        recorder = Recorder()
+        stop = threading.Event()
+        users = [
+            threading.Thread(
+                target=user,
+                args=(url.rstrip("/"), callbacks, recorder, stop, args.seed + i),
+                daemon=True,
+            )
+            for i in range(args.users)
+        ]
+        start = time.perf_counter()
+        for thread in users:
+            thread.start()
+        time.sleep(args.duration)
+        stop.set()
+        for thread in users:
+            thread.join()
+        summary = summarize(recorder, time.perf_counter() - start)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    summary["settings"] = {
+        "url": args.url,
+        "workers": None if args.url else args.workers,
+        "threads": None if args.url else args.threads,
+        "users": args.users,
+        "seed": args.seed,
+        "environment": {
+            k: v for k, v in os.environ.items() if k.startswith("EXTRUCAL_")
+        },
+    }
+    print_summary(summary)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(summary, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+"""
+Batch REST API on the Flask server of the dashboard
+
+Versioned endpoints returning the same grids as the tabs, for many scenarios
+per request:
+
+    POST /api/v1/throughput
+    POST /api/v1/cable
+    POST /api/v1/tube
+    POST /api/v1/rod
+    POST /api/v1/sheet
+
+The body is a JSON array of scenarios (or {"scenarios": [...]}), each one an
+object with the keyword arguments of the matching `engine.*_grid` function,
+e.g. [{"outer_d": 10, "thickness": 2, "s_density": 920}]. Results come back as
+JSON (one table per scenario, "split" orientation) or, with `?format=csv` or
+`Accept: text/csv`, as a CSV streamed scenario by scenario in long form
+(scenario, row, column, value). `GET /api/v1/<kind>` lists the parameters and
+their defaults.
+"""
+
+import csv
+import inspect
+import io
+import math
+import os
+
+from flask import Blueprint, Response, jsonify, request, stream_with_context
+
+from engine import DEPTH_PAD, RPM_PAD, SIZE_PAD, SPEED_PAD, depth_range
+from guardrails import GridRange, is_number
+
+API_PREFIX = "/api/v1"
+
+# Maximum number of scenarios in a single request
+MAX_SCENARIOS = int(os.environ.get("EXTRUCAL_API_MAX_SCENARIOS", 1000))
+
+# Ranges of each grid in the positional arguments of its `*_grid` function (the
+# last one being the rows of the grid)
+RPM_GRID_RANGES = [
+    GridRange("line speed", 4, 5, 6, SPEED_PAD),
+    GridRange("extruder size", 7, 8, 9, SIZE_PAD),
+]
+GRID_RANGES = {
+    "throughput": [
+        GridRange("channel depth", 5, 6, 7, DEPTH_PAD),
+        GridRange("screw RPM", 8, 9, 10, RPM_PAD),
+    ],
+    "cable": RPM_GRID_RANGES,
+    "tube": RPM_GRID_RANGES,
+    "rod": RPM_GRID_RANGES,
+    "sheet": RPM_GRID_RANGES,
+}
+
+# Internal arguments of the `*_grid` functions, not part of the API
+INTERNAL_PARAMETERS = ["rows"]
+
+
+class ScenarioError(ValueError):
+    """Raised for a scenario that can't be computed"""
+
+
+def public_signature(grid):
+    """Signature of `grid` without its `INTERNAL_PARAMETERS`"""
+    signature = inspect.signature(grid)
+    return signature.replace(
+        parameters=[
+            p
+            for p in signature.parameters.values()
+            if p.name not in INTERNAL_PARAMETERS
+        ]
+    )
+
+
+def bind_scenario(kind, grid, scenario):
+    """Positional arguments of `grid` for a scenario (a dict of keywords)"""
+    if not isinstance(scenario, dict):
+        raise ScenarioError("A scenario should be a JSON object")
+    try:
+        bound = public_signature(grid).bind(**scenario)
+    except TypeError as e:
+        raise ScenarioError(str(e))
+    bound.apply_defaults()
+    for name, value in bound.arguments.items():
+        # JSON allows integers of any size and Infinity/NaN, which the float
+        # maths of the grids can't handle
+        if is_number(value) and not is_finite(value):
+            raise ScenarioError(f"'{name}' should be a finite number")
+    params = list(bound.arguments.values())
+    # The default channel depths depend on the screw size, and count in the
+    # cells of the grid
+    if kind == "throughput" and is_number(params[0]):
+        params[5:8] = depth_range(params[0], *params[5:8])
+    return params
+
+
+def is_finite(value):
+    try:
+        return math.isfinite(float(value))
+    except OverflowError:
+        return False
+
+
+def run_scenario(kind, grid, policy, scenario):
+    """
+    Grid of one scenario, after the grid policy
+
+    Returns
+    -------
+    table, notice : pandas.DataFrame, str
+    """
+    params = bind_scenario(kind, grid, scenario)
+    try:
+        params, notice = policy.apply(params, GRID_RANGES[kind])
+        return grid(*params), notice
+    except (TypeError, ValueError, OverflowError) as e:
+        raise ScenarioError(str(e))
+
+
+def read_scenarios():
+    body = request.get_json(silent=True)
+    if isinstance(body, dict):
+        body = body.get("scenarios")
+    if not isinstance(body, list):
+        raise ScenarioError(
+            "The body should be a JSON array of scenarios or {'scenarios': [...]}"
+        )
+    if len(body) > MAX_SCENARIOS:
+        raise ScenarioError(f"At most {MAX_SCENARIOS} scenarios per request")
+    return body
+
+
+def wants_csv():
+    return (
+        request.args.get("format") == "csv"
+        or request.accept_mimetypes.best == "text/csv"
+    )
+
+
+def json_results(kind, grid, policy, scenarios):
+    results = []
+    for scenario in scenarios:
+        try:
+            table, notice = run_scenario(kind, grid, policy, scenario)
+        except ScenarioError as e:
+            results.append({"scenario": scenario, "error": str(e)})
+            continue
+        result = {"scenario": scenario, "table": table.to_dict("split")}
+        if notice:
+            result["notice"] = notice
+        results.append(result)
+    return jsonify({"results": results})
+
+
+def csv_results(kind, grid, policy, scenarios):
+    def rows():
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(["scenario", "row", "column", "value", "error"])
+        for i, scenario in enumerate(scenarios):
+            try:
+                table, _ = run_scenario(kind, grid, policy, scenario)
+            except ScenarioError as e:
+                writer.writerow([i, "", "", "", str(e)])
+            else:
+                for row, values in zip(table.index, table.values.tolist()):
+                    writer.writerows(
+                        [i, row, column, value, ""]
+                        for column, value in zip(table.columns, values)
+                    )
+            # One chunk per scenario keeps memory flat for large batches
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+
+    return Response(
+        stream_with_context(rows()),
+        mimetype="text/csv",
+        headers={"Content-Disposition": f"attachment; filename={kind}.csv"},
+    )
+
+
+def create_api(grids, policy):
+    """
+    Blueprint of the batch API
+
+    Parameters
+    ----------
+    grids  : dict
+             `*_grid` function of each kind ("throughput", "cable", ...)
+    policy : guardrails.GridPolicy
+             Admission control applied to every scenario
+    """
+    api = Blueprint("api_v1", __name__, url_prefix=API_PREFIX)
+
+    @api.get("/<kind>")
+    def describe(kind):
+        if kind not in grids:
+            return jsonify({"error": f"Unknown endpoint: {kind}"}), 404
+        parameters = public_signature(grids[kind]).parameters.values()
+        return jsonify(
+            {
+                "parameters": {
+                    p.name: (
+                        None if p.default is inspect.Parameter.empty else p.default
+                    )
+                    for p in parameters
+                }
+            }
+        )
+
+    @api.post("/<kind>")
+    def compute(kind):
+        if kind not in grids:
+            return jsonify({"error": f"Unknown endpoint: {kind}"}), 404
+        try:
+            scenarios = read_scenarios()
+        except ScenarioError as e:
+            return jsonify({"error": str(e)}), 400
+        if wants_csv():
+            return csv_results(kind, grids[kind], policy, scenarios)
+        return json_results(kind, grids[kind], policy, scenarios)
+
+    return api
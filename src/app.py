@@ -1,12 +1,77 @@
+import startup
+
+# Times the imports below for the startup report
+startup.timer.start()
+
+import math
+import os
+import time
+from functools import wraps
+
 import dash_bootstrap_components as dbc
-from dash import Dash, Input, Output, dash_table, dcc, html
-from pretty_html_table import build_table
+from dash import Dash, Input, Output, Patch, State, dash_table, dcc, html, no_update
+from dash.exceptions import PreventUpdate
 
-from extrucal.cable_extrusion import cable_cal, cable_plot, cable_table
-from extrucal.extrusion import throughput_cal, throughput_plot, throughput_table
-from extrucal.rod_extrusion import rod_cal, rod_plot, rod_table
-from extrucal.sheet_extrusion import sheet_cal, sheet_plot, sheet_table
-from extrucal.tube_extrusion import tube_cal, tube_plot, tube_table
+from api import GRID_RANGES, create_api
+from background import chunked, manager_from_env, report_progress
+from batch import (
+    EXTRUDER_COLUMNS,
+    PRODUCTS,
+    BatchError,
+    check_upload,
+    create_download,
+    load_job,
+    read_upload,
+    result_name,
+    save_job,
+)
+from cache import from_env as cache_from_env
+from cache import memoize
+from chartdata import create_chart_data
+from chartdata import refresh as refresh_chart_data
+from charts import (
+    CHART_MODES,
+    band_output,
+    rpm_output,
+    rpm_patch,
+    surface_output,
+    throughput_output,
+)
+from decimation import decimated
+from engine import (
+    MAX_SCREW_SIZE,
+    MIN_SCREW_SIZE,
+    RPM_PAD,
+    SIZE_PAD,
+    SPEED_PAD,
+    cable_area,
+    cable_grid,
+    check_cable,
+    check_depth,
+    check_material,
+    check_rod,
+    check_sheet,
+    check_tube,
+    max_line_speed,
+    min_extruder_size,
+    rod_area,
+    rod_grid,
+    sheet_area,
+    sheet_grid,
+    size_axis,
+    surface_grid,
+    throughput_grid,
+    tube_area,
+    tube_grid,
+)
+from fleet import DEFAULT_FLEET, FLEET_COLUMNS, FleetError, assign, utilization
+from guardrails import GridPolicy, GridRange, GridTooLarge
+from guardrails import from_env as grid_policy_from_env
+from incremental import extend_grid, extension
+from metrics import instrument, timed, watch_cache
+from profiling import profiled
+from tables import TABLE_MODES, datatable, datatable_page, html_table
+from tolerance import DISTRIBUTIONS, ToleranceError, rpm_bands
 
 # Styles
 
@@ -72,10 +137,341 @@ tab_selected_style = {
 
 left_column_style = {"width": "30%", "background-color": "#F0F0F0"}
 
+notice_style = {"color": "#B00020", "font-weight": 600}
+
+upload_style = {
+    "border": "2px dashed #808080",
+    "border-radius": "4px",
+    "background": "white",
+    "textAlign": "center",
+    "padding": "30px",
+}
+
+# Chart rendering: "altair" (Vega-Lite HTML in an iframe) or "plotly" (dcc.Graph)
+CHART_MODE = os.environ.get("EXTRUCAL_CHART_MODE", "altair")
+if CHART_MODE not in CHART_MODES:
+    raise ValueError(f"EXTRUCAL_CHART_MODE should be one of {CHART_MODES}")
+CHART_PROPERTY = "figure" if CHART_MODE == "plotly" else "srcDoc"
+
+
+def chart_frame(id, height):
+    """Component displaying a chart in the configured `CHART_MODE`"""
+    if CHART_MODE == "plotly":
+        return dcc.Graph(id=id, config={"displaylogo": False}, style={"width": "100%"})
+    return html.Iframe(
+        id=id, style={"border-width": "0", "width": "100%", "height": height}
+    )
+
+
+# Table rendering: "html" (styled HTML in an iframe) or "datatable" (paged on the server)
+TABLE_MODE = os.environ.get("EXTRUCAL_TABLE_MODE", "html")
+if TABLE_MODE not in TABLE_MODES:
+    raise ValueError(f"EXTRUCAL_TABLE_MODE should be one of {TABLE_MODES}")
+
+# Pre-render the default outputs of every tab at startup, and optionally embed
+# them in the initial layout so that the first paint needs no callback at all
+PRERENDER = os.environ.get("EXTRUCAL_PRERENDER", "1") == "1"
+EMBED_DEFAULTS = PRERENDER and os.environ.get("EXTRUCAL_EMBED_DEFAULTS", "0") == "1"
+
+# Print the import cost of each package and the pre-rendering time at boot
+STARTUP_REPORT = os.environ.get("EXTRUCAL_STARTUP_REPORT", "1") == "1"
+
+
+# Run the tab callbacks as background jobs with a progress bar (see background.py)
+BACKGROUND = os.environ.get("EXTRUCAL_BACKGROUND", "0") == "1"
+
+
+def progress_bar(id):
+    """Progress of the background job of a tab, only shown while it runs"""
+    return dbc.Progress(
+        id=id, value=0, max=1, striped=True, animated=True, style={"display": "none"}
+    )
+
+
+def table_frame(id):
+    """Component displaying a table in the configured `TABLE_MODE`"""
+    if TABLE_MODE == "datatable":
+        return datatable(id)
+    return html.Iframe(
+        id=id, style={"border-width": "0", "width": "100%", "height": "100%"}
+    )
+
+
+def table_outputs(id):
+    if TABLE_MODE == "datatable":
+        return [Output(id, "columns"), Output(id, "data"), Output(id, "page_count")]
+    return [Output(id, "srcDoc")]
+
+
+def table_states(id):
+    """Paging/sorting state passed to the tab callbacks in "datatable" mode"""
+    if TABLE_MODE == "datatable":
+        return [State(id, "page_current"), State(id, "page_size"), State(id, "sort_by")]
+    return []
+
+
+def inverse_panel(tab):
+    """
+    Inputs and answers of the inverse mode of a product tab: fastest line speed
+    of an extruder and smallest extruder for a line speed, under an RPM limit
+    """
+
+    def field(label, name, value):
+        return dbc.Col(
+            [
+                html.H5(label, style=h5_style),
+                dcc.Input(
+                    id=f"{tab}_inverse_{name}",
+                    type="number",
+                    value=value,
+                    debounce=True,
+                ),
+            ]
+        )
+
+    return html.Div(
+        [
+            html.H3("Line Speed and Extruder Size Limits", style=h3_style),
+            dbc.Row(
+                [
+                    field("Maximum Screw RPM", "rpm", 60),
+                    field("Extruder Size [mm]", "size", 90),
+                    field("Line Speed [m/min]", "l_speed", 10),
+                ]
+            ),
+            html.Br(),
+            html.Div(id=f"{tab}_inverse"),
+        ]
+    )
+
+
+def surface_panel():
+    """Inputs and heatmap of the surface mode of the "Throughput" tab"""
+
+    def field(label, id, value):
+        return dbc.Col(
+            [
+                html.H5(label, style=h5_style),
+                dcc.Input(id=id, type="number", value=value, debounce=True),
+            ]
+        )
+
+    return html.Div(
+        [
+            html.H3("Capacity Map", style=h3_style),
+            dbc.Row(
+                [
+                    field("Minimum Screw Size [mm]", "surface_min_size", 20),
+                    field("Maximum Screw Size [mm]", "surface_max_size", 200),
+                    field("Increment of Screw Size [mm]", "surface_delta_size", 5),
+                ]
+            ),
+            dbc.Row(
+                [
+                    field(
+                        "Metering Depth to Screw Size Ratio",
+                        "surface_depth_percent",
+                        0.05,
+                    ),
+                    dbc.Col(
+                        [
+                            html.H5("Number of Flights", style=h5_style),
+                            dcc.Dropdown(
+                                id="surface_flights",
+                                options=[
+                                    {"label": "1", "value": "1"},
+                                    {"label": "2", "value": "2"},
+                                    {"label": "1 and 2", "value": "1,2"},
+                                ],
+                                value="1",
+                                clearable=False,
+                            ),
+                        ]
+                    ),
+                    dbc.Col(),
+                ]
+            ),
+            html.H6("Over the screw RPMs of the tab, at the melt density of the tab"),
+            html.Div(id="throughput_surface_notice", style=notice_style),
+            dcc.Graph(
+                id="throughput_surface",
+                config={"displaylogo": False},
+                style={"width": "100%", "height": "600px"},
+            ),
+        ]
+    )
+
+
+def tolerance_panel(tab):
+    """
+    Inputs and percentile bands of the tolerance analysis of a product tab,
+    drawing the densities and the metering depth around the inputs of the tab
+    """
+
+    def field(label, name, value):
+        return dbc.Col(
+            [
+                html.H5(label, style=h5_style),
+                dcc.Input(
+                    id=f"{tab}_tolerance_{name}",
+                    type="number",
+                    value=value,
+                    min=0,
+                    debounce=True,
+                ),
+            ]
+        )
+
+    return html.Div(
+        [
+            html.H3("Tolerance Analysis", style=h3_style),
+            dbc.Row(
+                [
+                    field("Line Speed [m/min]", "l_speed", 10),
+                    dbc.Col(
+                        [
+                            html.H5("Distribution", style=h5_style),
+                            dcc.Dropdown(
+                                id=f"{tab}_tolerance_distribution",
+                                options=[
+                                    {"label": d.title(), "value": d}
+                                    for d in DISTRIBUTIONS
+                                ],
+                                value="normal",
+                                clearable=False,
+                            ),
+                        ]
+                    ),
+                    field("Draws", "draws", 20000),
+                ]
+            ),
+            dbc.Row(
+                [
+                    field("± Solid Density [kg/m^3]", "s_density", 20),
+                    field("± Density Ratio", "density_ratio", 0.02),
+                    field("± Metering Depth Ratio", "depth_percent", 0.002),
+                ]
+            ),
+            html.H6(
+                "Tolerances are standard deviations for the normal distribution "
+                "and half-widths for the others"
+            ),
+            html.Div(id=f"{tab}_tolerance_summary"),
+            chart_frame(f"{tab}_tolerance_plot", "45%"),
+        ]
+    )
+
+
+@timed("render")
+def table_output(table, *paging):
+    if TABLE_MODE == "datatable":
+        return datatable_page(table, *paging)
+    return (html_table(table),)
+
+
 # Setup app and layout/frontend
 app = Dash(__name__, external_stylesheets=[dbc.themes.BOOTSTRAP])
 server = app.server
 
+# Result cache in front of the grid computations and the rendered outputs,
+# grids evaluated block by block in background jobs (the last range of each
+# grid is its rows; the whole grid is cached, not its blocks), and time of the
+# computations and of the charts recorded in the metrics
+results = cache_from_env()
+throughput_grid = memoize(results)(
+    chunked(timed("compute")(throughput_grid), GRID_RANGES["throughput"][-1])
+)
+cable_grid = memoize(results)(
+    chunked(timed("compute")(cable_grid), GRID_RANGES["cable"][-1])
+)
+tube_grid = memoize(results)(
+    chunked(timed("compute")(tube_grid), GRID_RANGES["tube"][-1])
+)
+rod_grid = memoize(results)(chunked(timed("compute")(rod_grid), GRID_RANGES["rod"][-1]))
+sheet_grid = memoize(results)(
+    chunked(timed("compute")(sheet_grid), GRID_RANGES["sheet"][-1])
+)
+throughput_output = timed("render")(throughput_output)
+rpm_output = timed("render")(rpm_output)
+rpm_patch = timed("render")(rpm_patch)
+band_output = timed("render")(band_output)
+surface_grid = memoize(results)(timed("compute")(surface_grid))
+surface_output = timed("render")(surface_output)
+rpm_bands = timed("compute")(rpm_bands)
+
+# Job manager of the background callbacks
+job_manager = manager_from_env() if BACKGROUND else None
+# Jobs run in their own processes, so they can only share results through a
+# disk or redis cache
+if BACKGROUND and getattr(results, "shared", None) is None:
+    raise ValueError(
+        "EXTRUCAL_BACKGROUND=1 requires a shared result cache: set "
+        "EXTRUCAL_CACHE_BACKEND to 'disk' or 'redis'"
+    )
+
+# Admission control of the grid sizes of the tabs, whose styled HTML tables
+# take about 0.2 ms per cell to render, and of the batch API (no rendering).
+# A tab coarsens a grid over budget and says so, rather than showing nothing
+HTML_TABLE_MAX_CELLS = 20_000
+grid_policy = grid_policy_from_env(
+    HTML_TABLE_MAX_CELLS if TABLE_MODE == "html" else 100_000, action="downsample"
+)
+api_policy = grid_policy_from_env()
+
+# Admission control of the surfaces of the "Throughput" tab, which are drawn as
+# a single heatmap image and can be much larger than the other grids
+surface_policy = GridPolicy(
+    max_cells=int(os.environ.get("EXTRUCAL_SURFACE_MAX_CELLS", 500_000)),
+    action=grid_policy.action,
+)
+
+# Batch REST API on the same server (/api/v1/<kind>)
+server.register_blueprint(
+    create_api(
+        {
+            "throughput": throughput_grid,
+            "cable": cable_grid,
+            "tube": tube_grid,
+            "rod": rod_grid,
+            "sheet": sheet_grid,
+        },
+        api_policy,
+    )
+)
+
+# Streamed results of the uploads of the Batch tab (/batch/<token>.csv)
+server.register_blueprint(create_download())
+
+# Data of the Altair charts too large to be inlined (/chart-data/<digest>.json)
+server.register_blueprint(create_chart_data())
+
+# Latency, errors and response size of each callback, and cache hit ratios,
+# in the Prometheus format (/metrics)
+instrument(app)
+watch_cache(results)
+
+
+def memoize_output(func):
+    """
+    Caches the rendered outputs of a callback, which depend on `CHART_MODE`
+    and `TABLE_MODE`
+
+    The chart data published by the outputs is refreshed when they are
+    served from the cache, and the outputs are rendered again if it is gone.
+    """
+    cached = memoize(results, name=f"{func.__name__}:{CHART_MODE}:{TABLE_MODE}")(func)
+
+    @wraps(func)
+    def wrapper(*args):
+        outputs = cached(*args)
+        if not refresh_chart_data(outputs):
+            outputs = func(*args)
+            cached.prime(outputs, *args)
+        return outputs
+
+    return wrapper
+
+
 app.layout = dbc.Container(
     [
         html.H1("Extrucal Dashboard", style=h1_style),
@@ -84,6 +480,7 @@ app.layout = dbc.Container(
             [
                 dcc.Tab(
                     label="Throughput Calculation",
+                    value="throughput",
                     style=tab_style,
                     selected_style=tab_selected_style,
                     children=[
@@ -160,29 +557,21 @@ app.layout = dbc.Container(
                                 dbc.Col(
                                     [
                                         html.Br(),
-                                        html.H3("Predicted Throughput", style=h3_style),
-                                        html.Iframe(
-                                            id="throughput_plot",
-                                            style={
-                                                "border-width": "0",
-                                                "width": "100%",
-                                                "height": "76%",
-                                            },
+                                        html.Div(
+                                            id="throughput_notice", style=notice_style
                                         ),
+                                        progress_bar("throughput_progress"),
+                                        html.H3("Predicted Throughput", style=h3_style),
+                                        chart_frame("throughput_plot", "76%"),
                                         html.H6(
                                             "Note: Please put cursor onto the data point in the graph for the actual value"
                                         ),
                                         html.Br(),
                                         html.Br(),
                                         html.H3("Throughput Table", style=h3_style),
-                                        html.Iframe(
-                                            id="throughput_table",
-                                            style={
-                                                "border-width": "0",
-                                                "width": "100%",
-                                                "height": "100%",
-                                            },
-                                        ),
+                                        table_frame("throughput_table"),
+                                        html.Br(),
+                                        surface_panel(),
                                     ],
                                     md=8,
                                 ),
@@ -192,6 +581,7 @@ app.layout = dbc.Container(
                 ),
                 dcc.Tab(
                     label="Cable Extrusion",
+                    value="cable",
                     style=tab_style,
                     selected_style=tab_selected_style,
                     children=[
@@ -333,29 +723,22 @@ app.layout = dbc.Container(
                                 dbc.Col(
                                     [
                                         html.Br(),
+                                        html.Div(id="cable_notice", style=notice_style),
+                                        dcc.Store(id="cable_shown"),
+                                        progress_bar("cable_progress"),
                                         html.H3("Required Screw RPM", style=h3_style),
-                                        html.Iframe(
-                                            id="cable_plot",
-                                            style={
-                                                "border-width": "0",
-                                                "width": "100%",
-                                                "height": "45%",
-                                            },
-                                        ),
+                                        chart_frame("cable_plot", "45%"),
                                         html.H6(
                                             "Note: Please put cursor onto the data point in the graph for the actual value"
                                         ),
                                         html.Br(),
                                         html.Br(),
                                         html.H3("Screw RPM Table", style=h3_style),
-                                        html.Iframe(
-                                            id="cable_table",
-                                            style={
-                                                "border-width": "0",
-                                                "width": "100%",
-                                                "height": "100%",
-                                            },
-                                        ),
+                                        table_frame("cable_table"),
+                                        html.Br(),
+                                        inverse_panel("cable"),
+                                        html.Br(),
+                                        tolerance_panel("cable"),
                                     ],
                                     md=8,
                                 ),
@@ -365,6 +748,7 @@ app.layout = dbc.Container(
                 ),
                 dcc.Tab(
                     label="Tube Extrusion",
+                    value="tube",
                     style=tab_style,
                     selected_style=tab_selected_style,
                     children=[
@@ -505,29 +889,22 @@ app.layout = dbc.Container(
                                 dbc.Col(
                                     [
                                         html.Br(),
+                                        html.Div(id="tube_notice", style=notice_style),
+                                        dcc.Store(id="tube_shown"),
+                                        progress_bar("tube_progress"),
                                         html.H3("Required Screw RPM", style=h3_style),
-                                        html.Iframe(
-                                            id="tube_plot",
-                                            style={
-                                                "border-width": "0",
-                                                "width": "100%",
-                                                "height": "45%",
-                                            },
-                                        ),
+                                        chart_frame("tube_plot", "45%"),
                                         html.H6(
                                             "Note: Please put cursor onto the data point in the graph for the actual value"
                                         ),
                                         html.Br(),
                                         html.Br(),
                                         html.H3("Screw RPM Table", style=h3_style),
-                                        html.Iframe(
-                                            id="tube_table",
-                                            style={
-                                                "border-width": "0",
-                                                "width": "100%",
-                                                "height": "100%",
-                                            },
-                                        ),
+                                        table_frame("tube_table"),
+                                        html.Br(),
+                                        inverse_panel("tube"),
+                                        html.Br(),
+                                        tolerance_panel("tube"),
                                     ],
                                     md=8,
                                 ),
@@ -537,6 +914,7 @@ app.layout = dbc.Container(
                 ),
                 dcc.Tab(
                     label="Rod Extrusion",
+                    value="rod",
                     style=tab_style,
                     selected_style=tab_selected_style,
                     children=[
@@ -675,29 +1053,22 @@ app.layout = dbc.Container(
                                 dbc.Col(
                                     [
                                         html.Br(),
+                                        html.Div(id="rod_notice", style=notice_style),
+                                        dcc.Store(id="rod_shown"),
+                                        progress_bar("rod_progress"),
                                         html.H3("Required Screw RPM", style=h3_style),
-                                        html.Iframe(
-                                            id="rod_plot",
-                                            style={
-                                                "border-width": "0",
-                                                "width": "100%",
-                                                "height": "45%",
-                                            },
-                                        ),
+                                        chart_frame("rod_plot", "45%"),
                                         html.H6(
                                             "Note: Please put cursor onto the data point in the graph for the actual value"
                                         ),
                                         html.Br(),
                                         html.Br(),
                                         html.H3("Screw RPM Table", style=h3_style),
-                                        html.Iframe(
-                                            id="rod_table",
-                                            style={
-                                                "border-width": "0",
-                                                "width": "100%",
-                                                "height": "100%",
-                                            },
-                                        ),
+                                        table_frame("rod_table"),
+                                        html.Br(),
+                                        inverse_panel("rod"),
+                                        html.Br(),
+                                        tolerance_panel("rod"),
                                     ],
                                     md=8,
                                 ),
@@ -707,6 +1078,7 @@ app.layout = dbc.Container(
                 ),
                 dcc.Tab(
                     label="Sheet Extrusion",
+                    value="sheet",
                     style=tab_style,
                     selected_style=tab_selected_style,
                     children=[
@@ -843,29 +1215,170 @@ app.layout = dbc.Container(
                                 dbc.Col(
                                     [
                                         html.Br(),
+                                        html.Div(id="sheet_notice", style=notice_style),
+                                        dcc.Store(id="sheet_shown"),
+                                        progress_bar("sheet_progress"),
                                         html.H3("Required Screw RPM", style=h3_style),
-                                        html.Iframe(
-                                            id="sheet_plot",
-                                            style={
-                                                "border-width": "0",
-                                                "width": "100%",
-                                                "height": "45%",
-                                            },
-                                        ),
+                                        chart_frame("sheet_plot", "45%"),
                                         html.H6(
                                             "Note: Please put cursor onto the data point in the graph for the actual value"
                                         ),
                                         html.Br(),
                                         html.Br(),
                                         html.H3("Screw RPM Table", style=h3_style),
-                                        html.Iframe(
-                                            id="sheet_table",
-                                            style={
-                                                "border-width": "0",
-                                                "width": "100%",
-                                                "height": "100%",
-                                            },
+                                        table_frame("sheet_table"),
+                                        html.Br(),
+                                        inverse_panel("sheet"),
+                                        html.Br(),
+                                        tolerance_panel("sheet"),
+                                    ],
+                                    md=8,
+                                ),
+                            ]
+                        )
+                    ],
+                ),
+                dcc.Tab(
+                    label="Batch",
+                    value="batch",
+                    style=tab_style,
+                    selected_style=tab_selected_style,
+                    children=[
+                        dbc.Row(
+                            [
+                                dbc.Col(
+                                    [
+                                        html.Br(),
+                                        html.H5("Product", style=h5_style),
+                                        dcc.Dropdown(
+                                            id="batch_product",
+                                            options=[
+                                                {"label": kind.title(), "value": kind}
+                                                for kind in PRODUCTS
+                                            ],
+                                            value="cable",
+                                            clearable=False,
+                                        ),
+                                        html.Br(),
+                                        html.H5("Product Specs", style=h5_style),
+                                        dcc.Upload(
+                                            id="batch_upload",
+                                            children=html.Div(
+                                                [
+                                                    "Drag and drop or ",
+                                                    html.A("select a CSV/XLSX file"),
+                                                ]
+                                            ),
+                                            accept=".csv,.xlsx,.xls",
+                                            style=upload_style,
+                                        ),
+                                        html.Br(),
+                                        html.Div(id="batch_columns"),
+                                        html.Br(),
+                                    ],
+                                    md=4,
+                                    style=left_column_style,
+                                ),
+                                dbc.Col(
+                                    [
+                                        html.Br(),
+                                        html.Div(id="batch_notice", style=notice_style),
+                                        html.H3("Batch Results", style=h3_style),
+                                        html.Div(id="batch_summary"),
+                                    ],
+                                    md=8,
+                                ),
+                            ]
+                        )
+                    ],
+                ),
+                dcc.Tab(
+                    label="Fleet",
+                    value="fleet",
+                    style=tab_style,
+                    selected_style=tab_selected_style,
+                    children=[
+                        dbc.Row(
+                            [
+                                dbc.Col(
+                                    [
+                                        html.Br(),
+                                        html.H5("Extruders", style=h5_style),
+                                        dash_table.DataTable(
+                                            id="fleet_extruders",
+                                            columns=[
+                                                {
+                                                    "name": column,
+                                                    "id": column,
+                                                    "type": (
+                                                        "text"
+                                                        if column == "name"
+                                                        else "numeric"
+                                                    ),
+                                                }
+                                                for column in FLEET_COLUMNS
+                                            ],
+                                            data=DEFAULT_FLEET,
+                                            editable=True,
+                                            row_deletable=True,
+                                        ),
+                                        html.Br(),
+                                        dbc.Button(
+                                            "Add Extruder",
+                                            id="fleet_add",
+                                            color="secondary",
+                                            size="sm",
+                                        ),
+                                        html.Br(),
+                                        html.Br(),
+                                        html.H5("Product", style=h5_style),
+                                        dcc.Dropdown(
+                                            id="fleet_product",
+                                            options=[
+                                                {"label": kind.title(), "value": kind}
+                                                for kind in PRODUCTS
+                                            ],
+                                            value="cable",
+                                            clearable=False,
+                                        ),
+                                        html.Br(),
+                                        html.H5("Product Specs", style=h5_style),
+                                        dcc.Upload(
+                                            id="fleet_upload",
+                                            children=html.Div(
+                                                [
+                                                    "Drag and drop or ",
+                                                    html.A("select a CSV/XLSX file"),
+                                                ]
+                                            ),
+                                            accept=".csv,.xlsx,.xls",
+                                            style=upload_style,
+                                        ),
+                                        html.Br(),
+                                        html.H6(
+                                            "Same columns as in the Batch tab, "
+                                            "with an optional density_ratio"
+                                        ),
+                                        html.Br(),
+                                    ],
+                                    md=4,
+                                    style=left_column_style,
+                                ),
+                                dbc.Col(
+                                    [
+                                        html.Br(),
+                                        html.Div(id="fleet_notice", style=notice_style),
+                                        html.H3("Extruder Assignment", style=h3_style),
+                                        dcc.Store(id="fleet_job"),
+                                        html.Div(id="fleet_summary"),
+                                        html.Br(),
+                                        dbc.Button(
+                                            "Download Assignment (CSV)",
+                                            id="fleet_download_button",
+                                            color="secondary",
+                                            disabled=True,
                                         ),
+                                        dcc.Download(id="fleet_download"),
                                     ],
                                     md=8,
                                 ),
@@ -873,114 +1386,265 @@ app.layout = dbc.Container(
                         )
                     ],
                 ),
-            ]
+            ],
+            id="tabs",
+            value="throughput",
         ),
     ]
 )
 
 
-# Setup callbacks/backend for Throughput Plot
-@app.callback(
-    Output("throughput_plot", "srcDoc"),
-    Input("screw_size", "value"),
-    Input("melt_density", "value"),
-    Input("n_flight", "value"),
-    Input("min_rpm", "value"),
-    Input("max_rpm", "value"),
-    Input("delta_rpm", "value"),
-)
-def show_throughput_plot(
-    screw_size, melt_density, n_flight, min_rpm, max_rpm, delta_rpm
-):
-    output = throughput_plot(
-        screw_size,
-        melt_density,
-        n_flight=n_flight,
-        min_rpm=min_rpm,
-        max_rpm=max_rpm,
-        delta_rpm=delta_rpm,
+# Input ids of each tab, in the order of the arguments of its callback
+TAB_INPUTS = {
+    "throughput": [
+        "screw_size",
+        "melt_density",
+        "n_flight",
+        "min_rpm",
+        "max_rpm",
+        "delta_rpm",
+    ],
+    "cable": [
+        "cable_outer_d",
+        "cable_thickness",
+        "cable_s_density",
+        "cable_density_ratio",
+        "cable_min_l_speed",
+        "cable_max_l_speed",
+        "cable_delta_l_speed",
+        "cable_min_size",
+        "cable_max_size",
+        "cable_delta_size",
+        "cable_depth_percent",
+    ],
+    "tube": [
+        "tube_outer_d",
+        "tube_inner_d",
+        "tube_s_density",
+        "tube_density_ratio",
+        "tube_min_l_speed",
+        "tube_max_l_speed",
+        "tube_delta_l_speed",
+        "tube_min_size",
+        "tube_max_size",
+        "tube_delta_size",
+        "tube_depth_percent",
+    ],
+    "rod": [
+        "rod_outer_d",
+        "rod_s_density",
+        "rod_n_holes",
+        "rod_density_ratio",
+        "rod_min_l_speed",
+        "rod_max_l_speed",
+        "rod_delta_l_speed",
+        "rod_min_size",
+        "rod_max_size",
+        "rod_delta_size",
+        "rod_depth_percent",
+    ],
+    "sheet": [
+        "sheet_width",
+        "sheet_thickness",
+        "sheet_s_density",
+        "sheet_density_ratio",
+        "sheet_min_l_speed",
+        "sheet_max_l_speed",
+        "sheet_delta_l_speed",
+        "sheet_min_size",
+        "sheet_max_size",
+        "sheet_delta_size",
+        "sheet_depth_percent",
+    ],
+}
+
+
+# Ranges of the grid of each tab in its callback arguments
+RPM_GRID_RANGES = [
+    GridRange("line speed", 4, 5, 6, SPEED_PAD),
+    GridRange("extruder size", 7, 8, 9, SIZE_PAD),
+]
+TAB_RANGES = {
+    "throughput": [GridRange("screw RPM", 3, 4, 5, RPM_PAD)],
+    "cable": RPM_GRID_RANGES,
+    "tube": RPM_GRID_RANGES,
+    "rod": RPM_GRID_RANGES,
+    "sheet": RPM_GRID_RANGES,
+}
+
+# Cells per point of the ranges: the throughput grid also has up to 9 channel
+# depths (2% to 9% of the screw size)
+TAB_GRID_FACTORS = {"throughput": 9}
+
+# Tabs whose outputs are updated incrementally when a range is extended
+INCREMENTAL_TABS = ["cable", "tube", "rod", "sheet"]
+
+
+def background_options(tab):
+    """Arguments of `app.callback` running a tab callback as a background job"""
+    if not BACKGROUND:
+        return {}
+    return dict(
+        background=True,
+        manager=job_manager,
+        interval=250,
+        progress=[
+            Output(f"{tab}_progress", "value"),
+            Output(f"{tab}_progress", "max"),
+            Output(f"{tab}_progress", "label"),
+        ],
+        running=[
+            (
+                Output(f"{tab}_progress", "style"),
+                {"display": "flex"},
+                {"display": "none"},
+            )
+        ],
     )
-    return output.to_html()
 
 
-# Setup callbacks/backend for Throughput Table
+def in_background(func):
+    """
+    Takes the `set_progress` argument of the background jobs (None outside of a
+    job), passed to the grids of the callback
+    """
+    return report_progress(func) if BACKGROUND else func
+
+
+def when_active(tab):
+    """
+    Skips a tab callback (no computation, no update) while its tab is hidden
+
+    The wrapped callback receives the selected tab value as first argument.
+    Opening the tab fires the callback again with the current inputs.
+    """
+
+    def decorator(func):
+        @wraps(func)
+        def wrapper(selected_tab, *args):
+            if selected_tab != tab:
+                raise PreventUpdate
+            return func(*args)
+
+        return wrapper
+
+    return decorator
+
+
+def guarded(tab):
+    """
+    Applies `grid_policy` to the ranges of a tab callback before computing
+
+    The notice of the policy is appended to the outputs of the callback. A
+    rejected grid leaves the plot and the table unchanged and only shows the
+    notice.
+    """
+
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args):
+            n_inputs = len(TAB_INPUTS[tab])
+            try:
+                params, notice = grid_policy.apply(
+                    args[:n_inputs], TAB_RANGES[tab], TAB_GRID_FACTORS.get(tab, 1)
+                )
+            except GridTooLarge as e:
+                n_outputs = 1 + len(table_outputs(f"{tab}_table"))
+                n_outputs += tab in INCREMENTAL_TABS
+                return (no_update,) * n_outputs + (str(e),)
+            return (*func(*params, *args[n_inputs:]), notice)
+
+        return wrapper
+
+    return decorator
+
+
+def incremental(tab):
+    """
+    Computes only the new rows or columns of the grid of a product tab when
+    its inputs extend one range of the displayed outputs, and patches the
+    outputs that are JSON (Plotly chart, DataTable columns)
+
+    The wrapped callback receives the inputs of the displayed outputs (the
+    `{tab}_shown` store) as last argument, and returns its inputs for that
+    store after its outputs.
+    """
+
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args):
+            n_inputs = len(TAB_INPUTS[tab])
+            params, paging, shown = args[:n_inputs], args[n_inputs:-1], args[-1]
+            ext = extension(shown, params, TAB_RANGES[tab])
+            table = None
+            if ext is not None:
+                try:
+                    table, extra = extend_grid(TAB_GRIDS[tab], shown, params, ext)
+                except (TypeError, ValueError):
+                    # Left to the full computation to report
+                    pass
+            if table is None:
+                return (*func(*params, *paging), list(params))
+
+            ranges = params[4:10]
+            if CHART_MODE == "plotly" and not decimated(*table.shape):
+                plot = rpm_patch(extra, ext.axis, *ranges[3:])
+            else:
+                plot = rpm_output(table, *ranges, CHART_MODE)
+            tables = table_output(table, *paging)
+            if TABLE_MODE == "datatable":
+                columns, data, page_count = tables
+                if ext.axis == "columns":
+                    columns_patch = Patch()
+                    columns_patch.extend(columns[-len(extra.columns) :])
+                else:
+                    columns_patch = no_update
+                tables = (columns_patch, data, page_count)
+            return (plot, *tables, list(params))
+
+        return wrapper
+
+    return decorator
+
+
+# Setup callbacks/backend for Throughput Plot and Table
 @app.callback(
-    Output("throughput_table", "srcDoc"),
+    Output("throughput_plot", CHART_PROPERTY),
+    *table_outputs("throughput_table"),
+    Output("throughput_notice", "children"),
+    Input("tabs", "value"),
     Input("screw_size", "value"),
     Input("melt_density", "value"),
     Input("n_flight", "value"),
     Input("min_rpm", "value"),
     Input("max_rpm", "value"),
     Input("delta_rpm", "value"),
+    *table_states("throughput_table"),
+    prevent_initial_call=EMBED_DEFAULTS,
+    **background_options("throughput"),
 )
-def show_throughput_table(
-    screw_size, melt_density, n_flight, min_rpm, max_rpm, delta_rpm
-):
-    output = throughput_table(
-        screw_size,
-        melt_density,
-        n_flight=n_flight,
-        min_rpm=min_rpm,
-        max_rpm=max_rpm,
-        delta_rpm=delta_rpm,
-    )
-    return build_table(
-        output,
-        "grey_light",
-        font_size="16px",
-        index=True,
-        text_align="center",
-        padding="5px",
-    )
-
-
-# Setup callbacks/backend for Cable Plot
-@app.callback(
-    Output("cable_plot", "srcDoc"),
-    Input("cable_outer_d", "value"),
-    Input("cable_thickness", "value"),
-    Input("cable_s_density", "value"),
-    Input("cable_density_ratio", "value"),
-    Input("cable_min_l_speed", "value"),
-    Input("cable_max_l_speed", "value"),
-    Input("cable_delta_l_speed", "value"),
-    Input("cable_min_size", "value"),
-    Input("cable_max_size", "value"),
-    Input("cable_delta_size", "value"),
-    Input("cable_depth_percent", "value"),
-)
-def show_cable_plot(
-    outer_d,
-    thickness,
-    s_density,
-    density_ratio,
-    min_l_speed,
-    max_l_speed,
-    delta_l_speed,
-    min_size,
-    max_size,
-    delta_size,
-    depth_percent,
+@in_background
+@when_active("throughput")
+@profiled
+@guarded("throughput")
+@memoize_output
+def show_throughput(
+    screw_size, melt_density, n_flight, min_rpm, max_rpm, delta_rpm, *paging
 ):
-    output = cable_plot(
-        outer_d=outer_d,
-        thickness=thickness,
-        s_density=s_density,
-        density_ratio=density_ratio,
-        min_l_speed=min_l_speed,
-        max_l_speed=max_l_speed,
-        delta_l_speed=delta_l_speed,
-        min_size=min_size,
-        max_size=max_size,
-        delta_size=delta_size,
-        depth_percent=depth_percent,
+    output = throughput_tab_grid(
+        screw_size, melt_density, n_flight, min_rpm, max_rpm, delta_rpm
     )
-    return output.to_html()
+    plot = throughput_output(output, min_rpm, max_rpm, delta_rpm, CHART_MODE)
+    return plot, *table_output(output, *paging)
 
 
-# Setup callbacks/backend for Cable Table
+# Setup callbacks/backend for Cable Plot and Table
 @app.callback(
-    Output("cable_table", "srcDoc"),
+    Output("cable_plot", CHART_PROPERTY),
+    *table_outputs("cable_table"),
+    Output("cable_shown", "data"),
+    Output("cable_notice", "children"),
+    Input("tabs", "value"),
     Input("cable_outer_d", "value"),
     Input("cable_thickness", "value"),
     Input("cable_s_density", "value"),
@@ -992,8 +1656,18 @@ def show_cable_plot(
     Input("cable_max_size", "value"),
     Input("cable_delta_size", "value"),
     Input("cable_depth_percent", "value"),
+    *table_states("cable_table"),
+    State("cable_shown", "data"),
+    prevent_initial_call=EMBED_DEFAULTS,
+    **background_options("cable"),
 )
-def show_cable_table(
+@in_background
+@when_active("cable")
+@profiled
+@guarded("cable")
+@incremental("cable")
+@memoize_output
+def show_cable(
     outer_d,
     thickness,
     s_density,
@@ -1005,8 +1679,9 @@ def show_cable_table(
     max_size,
     delta_size,
     depth_percent,
+    *paging,
 ):
-    output = cable_table(
+    output = cable_grid(
         outer_d=outer_d,
         thickness=thickness,
         s_density=s_density,
@@ -1019,63 +1694,26 @@ def show_cable_table(
         delta_size=delta_size,
         depth_percent=depth_percent,
     )
-    return build_table(
+    plot = rpm_output(
         output,
-        "grey_light",
-        font_size="16px",
-        index=True,
-        text_align="center",
-        padding="5px",
-    )
-
-
-# Setup callbacks/backend for Tube Plot
-@app.callback(
-    Output("tube_plot", "srcDoc"),
-    Input("tube_outer_d", "value"),
-    Input("tube_inner_d", "value"),
-    Input("tube_s_density", "value"),
-    Input("tube_density_ratio", "value"),
-    Input("tube_min_l_speed", "value"),
-    Input("tube_max_l_speed", "value"),
-    Input("tube_delta_l_speed", "value"),
-    Input("tube_min_size", "value"),
-    Input("tube_max_size", "value"),
-    Input("tube_delta_size", "value"),
-    Input("tube_depth_percent", "value"),
-)
-def show_tube_plot(
-    outer_d,
-    inner_d,
-    s_density,
-    density_ratio,
-    min_l_speed,
-    max_l_speed,
-    delta_l_speed,
-    min_size,
-    max_size,
-    delta_size,
-    depth_percent,
-):
-    output = tube_plot(
-        outer_d=outer_d,
-        inner_d=inner_d,
-        s_density=s_density,
-        density_ratio=density_ratio,
-        min_l_speed=min_l_speed,
-        max_l_speed=max_l_speed,
-        delta_l_speed=delta_l_speed,
-        min_size=min_size,
-        max_size=max_size,
-        delta_size=delta_size,
-        depth_percent=depth_percent,
+        min_l_speed,
+        max_l_speed,
+        delta_l_speed,
+        min_size,
+        max_size,
+        delta_size,
+        CHART_MODE,
     )
-    return output.to_html()
+    return plot, *table_output(output, *paging)
 
 
-# Setup callbacks/backend for Tube Table
+# Setup callbacks/backend for Tube Plot and Table
 @app.callback(
-    Output("tube_table", "srcDoc"),
+    Output("tube_plot", CHART_PROPERTY),
+    *table_outputs("tube_table"),
+    Output("tube_shown", "data"),
+    Output("tube_notice", "children"),
+    Input("tabs", "value"),
     Input("tube_outer_d", "value"),
     Input("tube_inner_d", "value"),
     Input("tube_s_density", "value"),
@@ -1087,8 +1725,18 @@ def show_tube_plot(
     Input("tube_max_size", "value"),
     Input("tube_delta_size", "value"),
     Input("tube_depth_percent", "value"),
+    *table_states("tube_table"),
+    State("tube_shown", "data"),
+    prevent_initial_call=EMBED_DEFAULTS,
+    **background_options("tube"),
 )
-def show_tube_table(
+@in_background
+@when_active("tube")
+@profiled
+@guarded("tube")
+@incremental("tube")
+@memoize_output
+def show_tube(
     outer_d,
     inner_d,
     s_density,
@@ -1100,8 +1748,9 @@ def show_tube_table(
     max_size,
     delta_size,
     depth_percent,
+    *paging,
 ):
-    output = tube_table(
+    output = tube_grid(
         outer_d=outer_d,
         inner_d=inner_d,
         s_density=s_density,
@@ -1114,19 +1763,26 @@ def show_tube_table(
         delta_size=delta_size,
         depth_percent=depth_percent,
     )
-    return build_table(
+    plot = rpm_output(
         output,
-        "grey_light",
-        font_size="16px",
-        index=True,
-        text_align="center",
-        padding="5px",
+        min_l_speed,
+        max_l_speed,
+        delta_l_speed,
+        min_size,
+        max_size,
+        delta_size,
+        CHART_MODE,
     )
+    return plot, *table_output(output, *paging)
 
 
-# Setup callbacks/backend for Rod Plot
+# Setup callbacks/backend for Rod Plot and Table
 @app.callback(
-    Output("rod_plot", "srcDoc"),
+    Output("rod_plot", CHART_PROPERTY),
+    *table_outputs("rod_table"),
+    Output("rod_shown", "data"),
+    Output("rod_notice", "children"),
+    Input("tabs", "value"),
     Input("rod_outer_d", "value"),
     Input("rod_s_density", "value"),
     Input("rod_n_holes", "value"),
@@ -1138,8 +1794,18 @@ def show_tube_table(
     Input("rod_max_size", "value"),
     Input("rod_delta_size", "value"),
     Input("rod_depth_percent", "value"),
+    *table_states("rod_table"),
+    State("rod_shown", "data"),
+    prevent_initial_call=EMBED_DEFAULTS,
+    **background_options("rod"),
 )
-def show_rod_plot(
+@in_background
+@when_active("rod")
+@profiled
+@guarded("rod")
+@incremental("rod")
+@memoize_output
+def show_rod(
     outer_d,
     s_density,
     n_holes,
@@ -1151,8 +1817,9 @@ def show_rod_plot(
     max_size,
     delta_size,
     depth_percent,
+    *paging,
 ):
-    output = rod_plot(
+    output = rod_grid(
         outer_d=outer_d,
         s_density=s_density,
         n_holes=n_holes,
@@ -1165,63 +1832,26 @@ def show_rod_plot(
         delta_size=delta_size,
         depth_percent=depth_percent,
     )
-    return output.to_html()
-
-
-# Setup callbacks/backend for Rod Table
-@app.callback(
-    Output("rod_table", "srcDoc"),
-    Input("rod_outer_d", "value"),
-    Input("rod_s_density", "value"),
-    Input("rod_n_holes", "value"),
-    Input("rod_density_ratio", "value"),
-    Input("rod_min_l_speed", "value"),
-    Input("rod_max_l_speed", "value"),
-    Input("rod_delta_l_speed", "value"),
-    Input("rod_min_size", "value"),
-    Input("rod_max_size", "value"),
-    Input("rod_delta_size", "value"),
-    Input("rod_depth_percent", "value"),
-)
-def show_rod_table(
-    outer_d,
-    s_density,
-    n_holes,
-    density_ratio,
-    min_l_speed,
-    max_l_speed,
-    delta_l_speed,
-    min_size,
-    max_size,
-    delta_size,
-    depth_percent,
-):
-    output = rod_table(
-        outer_d=outer_d,
-        s_density=s_density,
-        n_holes=n_holes,
-        density_ratio=density_ratio,
-        min_l_speed=min_l_speed,
-        max_l_speed=max_l_speed,
-        delta_l_speed=delta_l_speed,
-        min_size=min_size,
-        max_size=max_size,
-        delta_size=delta_size,
-        depth_percent=depth_percent,
-    )
-    return build_table(
+    plot = rpm_output(
         output,
-        "grey_light",
-        font_size="16px",
-        index=True,
-        text_align="center",
-        padding="5px",
+        min_l_speed,
+        max_l_speed,
+        delta_l_speed,
+        min_size,
+        max_size,
+        delta_size,
+        CHART_MODE,
     )
+    return plot, *table_output(output, *paging)
 
 
-# Setup callbacks/backend for Sheet Plot
+# Setup callbacks/backend for Sheet Plot and Table
 @app.callback(
-    Output("sheet_plot", "srcDoc"),
+    Output("sheet_plot", CHART_PROPERTY),
+    *table_outputs("sheet_table"),
+    Output("sheet_shown", "data"),
+    Output("sheet_notice", "children"),
+    Input("tabs", "value"),
     Input("sheet_width", "value"),
     Input("sheet_thickness", "value"),
     Input("sheet_s_density", "value"),
@@ -1233,8 +1863,18 @@ def show_rod_table(
     Input("sheet_max_size", "value"),
     Input("sheet_delta_size", "value"),
     Input("sheet_depth_percent", "value"),
+    *table_states("sheet_table"),
+    State("sheet_shown", "data"),
+    prevent_initial_call=EMBED_DEFAULTS,
+    **background_options("sheet"),
 )
-def show_sheet_plot(
+@in_background
+@when_active("sheet")
+@profiled
+@guarded("sheet")
+@incremental("sheet")
+@memoize_output
+def show_sheet(
     width,
     thickness,
     s_density,
@@ -1246,8 +1886,9 @@ def show_sheet_plot(
     max_size,
     delta_size,
     depth_percent,
+    *paging,
 ):
-    output = sheet_plot(
+    output = sheet_grid(
         width=width,
         thickness=thickness,
         s_density=s_density,
@@ -1260,59 +1901,622 @@ def show_sheet_plot(
         delta_size=delta_size,
         depth_percent=depth_percent,
     )
-    return output.to_html()
+    plot = rpm_output(
+        output,
+        min_l_speed,
+        max_l_speed,
+        delta_l_speed,
+        min_size,
+        max_size,
+        delta_size,
+        CHART_MODE,
+    )
+    return plot, *table_output(output, *paging)
+
+
+# Setup callbacks/backend for the Batch tab
+@app.callback(Output("batch_columns", "children"), Input("batch_product", "value"))
+def show_batch_columns(product):
+    required, optional = PRODUCTS[product]
+    return [
+        html.H6("Required columns: " + ", ".join(required)),
+        html.H6(
+            "Optional columns: "
+            + ", ".join(list(optional) + list(EXTRUDER_COLUMNS))
+            + " (with an extruder size, the required screw RPM is calculated too)"
+        ),
+    ]
 
 
-# Setup callbacks/backend for Sheet Table
 @app.callback(
-    Output("sheet_table", "srcDoc"),
-    Input("sheet_width", "value"),
-    Input("sheet_thickness", "value"),
-    Input("sheet_s_density", "value"),
-    Input("sheet_density_ratio", "value"),
-    Input("sheet_min_l_speed", "value"),
-    Input("sheet_max_l_speed", "value"),
-    Input("sheet_delta_l_speed", "value"),
-    Input("sheet_min_size", "value"),
-    Input("sheet_max_size", "value"),
-    Input("sheet_delta_size", "value"),
-    Input("sheet_depth_percent", "value"),
+    Output("batch_summary", "children"),
+    Output("batch_notice", "children"),
+    Input("batch_upload", "contents"),
+    Input("batch_product", "value"),
+    State("batch_upload", "filename"),
+    prevent_initial_call=True,
 )
-def show_sheet_table(
-    width,
-    thickness,
-    s_density,
-    density_ratio,
-    min_l_speed,
-    max_l_speed,
-    delta_l_speed,
-    min_size,
-    max_size,
-    delta_size,
-    depth_percent,
+def upload_batch(contents, product, filename):
+    if contents is None:
+        raise PreventUpdate
+    try:
+        table = read_upload(contents, filename)
+        check_upload(product, table)
+    except BatchError as e:
+        return None, str(e)
+    # The rows are evaluated while the results are downloaded, not here
+    token = save_job(product, table, filename)
+    return [
+        html.H5(f"{len(table):,} {product} specs read from {filename}", style=h5_style),
+        dbc.Table.from_dataframe(table.head(10), striped=True, size="sm"),
+        html.A(
+            dbc.Button("Download Results (CSV)", color="secondary"),
+            href=f"/batch/{token}.csv",
+        ),
+    ], ""
+
+
+# Setup callbacks/backend for the Fleet tab
+@app.callback(
+    Output("fleet_extruders", "data"),
+    Input("fleet_add", "n_clicks"),
+    State("fleet_extruders", "data"),
+    prevent_initial_call=True,
+)
+def add_extruder(n_clicks, extruders):
+    return extruders + [dict.fromkeys(FLEET_COLUMNS)]
+
+
+@app.callback(
+    Output("fleet_job", "data"),
+    Output("fleet_notice", "children"),
+    Input("fleet_upload", "contents"),
+    Input("fleet_product", "value"),
+    State("fleet_upload", "filename"),
+    prevent_initial_call=True,
+)
+def upload_fleet(contents, product, filename):
+    if contents is None:
+        raise PreventUpdate
+    try:
+        table = read_upload(contents, filename)
+        check_upload(product, table)
+    except BatchError as e:
+        return None, str(e)
+    return save_job(product, table, filename), ""
+
+
+def fleet_assignment(token, extruders):
+    """Assignment of the products of an upload, None if the job has expired"""
+    job = load_job(token)
+    if job is None:
+        return None
+    kind, table, _ = job
+    assignment, _ = assign(kind, table, extruders)
+    return assignment
+
+
+@app.callback(
+    Output("fleet_summary", "children"),
+    Output("fleet_download_button", "disabled"),
+    Input("fleet_job", "data"),
+    Input("fleet_extruders", "data"),
+)
+def show_fleet(token, extruders):
+    if token is None:
+        return html.H6("Upload product specs to assign them to the extruders"), True
+    try:
+        assignment = fleet_assignment(token, extruders)
+    except FleetError as e:
+        return html.P(str(e), style=notice_style), True
+    if assignment is None:
+        return html.P("The upload has expired", style=notice_style), True
+
+    failed = int((assignment["error"] != "").sum())
+    return [
+        html.H5(
+            f"{len(assignment) - failed:,} of {len(assignment):,} products assigned",
+            style=h5_style,
+        ),
+        dbc.Table(
+            [
+                html.Thead(
+                    html.Tr(
+                        [
+                            html.Th(c)
+                            for c in ["Extruder", "Size", "Max RPM", "Products"]
+                        ]
+                    )
+                ),
+                html.Tbody(
+                    [
+                        html.Tr(
+                            [
+                                html.Td(row["extruder"]),
+                                html.Td(f"{row['size']:g}"),
+                                html.Td(f"{row['max_rpm']:g}"),
+                                html.Td(f"{row['products']:,}"),
+                            ]
+                        )
+                        for row in utilization(assignment, extruders)
+                    ]
+                ),
+            ],
+            striped=True,
+            size="sm",
+        ),
+        html.H5("First products", style=h5_style),
+        dbc.Table.from_dataframe(assignment.head(10), striped=True, size="sm"),
+    ], False
+
+
+@app.callback(
+    Output("fleet_download", "data"),
+    Input("fleet_download_button", "n_clicks"),
+    State("fleet_job", "data"),
+    State("fleet_extruders", "data"),
+    prevent_initial_call=True,
+)
+def download_fleet(n_clicks, token, extruders):
+    try:
+        assignment = fleet_assignment(token, extruders)
+    except FleetError:
+        raise PreventUpdate
+    if assignment is None:
+        raise PreventUpdate
+    _, _, filename = load_job(token)
+    return dcc.send_data_frame(
+        assignment.to_csv, result_name(filename, "fleet"), index=False
+    )
+
+
+def throughput_tab_grid(
+    screw_size, melt_density, n_flight, min_rpm, max_rpm, delta_rpm
 ):
-    output = sheet_table(
-        width=width,
-        thickness=thickness,
-        s_density=s_density,
-        density_ratio=density_ratio,
-        min_l_speed=min_l_speed,
-        max_l_speed=max_l_speed,
-        delta_l_speed=delta_l_speed,
-        min_size=min_size,
-        max_size=max_size,
-        delta_size=delta_size,
-        depth_percent=depth_percent,
+    return throughput_grid(
+        screw_size,
+        melt_density,
+        n_flight=n_flight,
+        min_rpm=min_rpm,
+        max_rpm=max_rpm,
+        delta_rpm=delta_rpm,
     )
-    return build_table(
-        output,
-        "grey_light",
-        font_size="16px",
-        index=True,
-        text_align="center",
-        padding="5px",
+
+
+# Grid of each tab, called with the values of `TAB_INPUTS`
+TAB_GRIDS = {
+    "throughput": throughput_tab_grid,
+    "cable": cable_grid,
+    "tube": tube_grid,
+    "rod": rod_grid,
+    "sheet": sheet_grid,
+}
+
+
+def page_table(tab):
+    """Callback sending another page (or sort order) of the table of a tab"""
+
+    def page(page_current, page_size, sort_by, *params):
+        try:
+            params, _ = grid_policy.apply(
+                params, TAB_RANGES[tab], TAB_GRID_FACTORS.get(tab, 1)
+            )
+        except GridTooLarge:
+            raise PreventUpdate
+        table = TAB_GRIDS[tab](*params)
+        _, data, page_count = datatable_page(table, page_current, page_size, sort_by)
+        return data, page_count
+
+    page.__name__ = f"page_{tab}_table"
+    return page
+
+
+# Setup callbacks/backend for server-side paging and sorting of the tables
+if TABLE_MODE == "datatable":
+    for tab, inputs in TAB_INPUTS.items():
+        app.callback(
+            Output(f"{tab}_table", "data", allow_duplicate=True),
+            Output(f"{tab}_table", "page_count", allow_duplicate=True),
+            Input(f"{tab}_table", "page_current"),
+            Input(f"{tab}_table", "page_size"),
+            Input(f"{tab}_table", "sort_by"),
+            *[State(i, "value") for i in inputs],
+            prevent_initial_call=True,
+        )(page_table(tab))
+
+
+# Cross section of the product of each tab, and the inputs it is computed from
+TAB_AREAS = {
+    "cable": (cable_area, ["cable_outer_d", "cable_thickness"]),
+    "tube": (tube_area, ["tube_outer_d", "tube_inner_d"]),
+    "rod": (rod_area, ["rod_outer_d", "rod_n_holes"]),
+    "sheet": (sheet_area, ["sheet_width", "sheet_thickness"]),
+}
+
+# Geometry checks of the product of each tab (the ones of its grid)
+TAB_CHECKS = {
+    "cable": check_cable,
+    "tube": check_tube,
+    "rod": check_rod,
+    "sheet": check_sheet,
+}
+
+# Range of the extruder sizes in the arguments of `size_range`
+SIZE_RANGE = GridRange("extruder size", 0, 1, 2, SIZE_PAD)
+
+
+def product_area(tab, geometry):
+    """Cross section of the product of a tab, checked like the grid of the tab"""
+    area_of, _ = TAB_AREAS[tab]
+    TAB_CHECKS[tab](*geometry)
+    return area_of(*geometry)
+
+
+def size_range(min_size, max_size, delta_size, count):
+    """
+    Extruder sizes of the range inputs of a product tab, within the budget of
+    `grid_policy`, evenly thinned out to at most `count` sizes
+
+    Returns
+    -------
+    sizes, notice : numpy.ndarray, str
+                    extruder sizes, and the notice of the policy
+
+    Raises
+    ------
+    ValueError
+        for a range that can't be sampled (`GridTooLarge` over the budget)
+    """
+    if min_size > max_size:
+        raise ValueError("'min_size' can't be greater than 'max_size'")
+    if not delta_size > 0:
+        raise ValueError("'delta_size' should be positive")
+    (min_size, max_size, delta_size), notice = grid_policy.apply(
+        [min_size, max_size, delta_size], [SIZE_RANGE]
     )
+    sizes = size_axis(min_size, max_size, delta_size)
+    return sizes[:: math.ceil(len(sizes) / count)], notice
+
+
+# Inputs of the inverse mode of a tab after its geometry (without the prefix)
+INVERSE_INPUTS = [
+    "s_density",
+    "density_ratio",
+    "depth_percent",
+    "min_size",
+    "max_size",
+    "delta_size",
+    "inverse_rpm",
+    "inverse_size",
+    "inverse_l_speed",
+]
+
+# Columns of the table of the fastest line speed of each extruder size
+INVERSE_TABLE_SIZES = 50
+
+
+def solve_inverse(tab):
+    """
+    Callback of the inverse mode of a product tab, solved in closed form
+    instead of reading the answers off the grid
+    """
+    _, geometry = TAB_AREAS[tab]
+
+    def inverse(*values):
+        if any(
+            not isinstance(v, (int, float)) or isinstance(v, bool) or v <= 0
+            for v in values
+        ):
+            return html.P("Please enter positive values", style=notice_style)
+        (
+            s_density,
+            density_ratio,
+            depth_percent,
+            min_size,
+            max_size,
+            delta_size,
+            max_rpm,
+            size,
+            l_speed,
+        ) = values[len(geometry) :]
+        try:
+            area = product_area(tab, values[: len(geometry)])
+            # Same material and screw checks as the grid of the tab
+            check_material(s_density, density_ratio)
+            check_depth(depth_percent)
+            # Every extruder size of the grid at once (evenly thinned out to
+            # `INVERSE_TABLE_SIZES` columns)
+            sizes, notice = size_range(
+                min_size, max_size, delta_size, INVERSE_TABLE_SIZES
+            )
+        except (TypeError, ValueError) as e:
+            return html.P(str(e), style=notice_style)
+        if area <= 0:
+            return html.P("The product has no cross section", style=notice_style)
+
+        solve = dict(
+            area=area,
+            s_density=s_density,
+            density_ratio=density_ratio,
+            max_rpm=max_rpm,
+            depth_percent=depth_percent,
+        )
+        speed = max_line_speed(size=size, **solve)
+        smallest = min_extruder_size(l_speed=l_speed, **solve)
+        speeds = max_line_speed(size=sizes, **solve)
+        return [
+            html.H5(
+                f"Fastest line speed on a {size:g} mm extruder at {max_rpm:g} RPM: "
+                f"{speed:,.2f} m/min"
+            ),
+            html.H5(
+                f"Smallest extruder for {l_speed:g} m/min at {max_rpm:g} RPM: "
+                f"{smallest:,.1f} mm"
+                + (
+                    ""
+                    if MIN_SCREW_SIZE <= smallest <= MAX_SCREW_SIZE
+                    else f" (outside of the {MIN_SCREW_SIZE}-{MAX_SCREW_SIZE} mm "
+                    "screws of extrucal)"
+                )
+            ),
+            dbc.Table(
+                [
+                    html.Thead(
+                        html.Tr(
+                            [html.Th("Extruder size [mm]")]
+                            + [html.Th(f"{k:g}") for k in sizes]
+                        )
+                    ),
+                    html.Tbody(
+                        html.Tr(
+                            [html.Th(f"Max line speed at {max_rpm:g} RPM [m/min]")]
+                            + [html.Td(f"{v:,.2f}") for v in speeds]
+                        )
+                    ),
+                ],
+                bordered=True,
+                size="sm",
+                responsive=True,
+            ),
+            html.Div(notice, style=notice_style),
+        ]
+
+    inverse.__name__ = f"solve_{tab}_inverse"
+    return inverse
+
+
+# Setup callbacks/backend for the inverse mode of the product tabs
+for tab, (_, geometry) in TAB_AREAS.items():
+    app.callback(
+        Output(f"{tab}_inverse", "children"),
+        Input("tabs", "value"),
+        *[Input(id, "value") for id in geometry],
+        *[Input(f"{tab}_{name}", "value") for name in INVERSE_INPUTS],
+    )(when_active(tab)(solve_inverse(tab)))
+
+
+# Ranges of the surface in the arguments of `show_surface`
+SURFACE_RANGES = [
+    GridRange("screw size", 4, 5, 6, SIZE_PAD),
+    GridRange("screw RPM", 1, 2, 3, RPM_PAD),
+]
+
+
+# Setup callbacks/backend for the surface mode of the "Throughput" tab
+@app.callback(
+    Output("throughput_surface", "figure"),
+    Output("throughput_surface_notice", "children"),
+    Input("tabs", "value"),
+    Input("melt_density", "value"),
+    Input("min_rpm", "value"),
+    Input("max_rpm", "value"),
+    Input("delta_rpm", "value"),
+    Input("surface_min_size", "value"),
+    Input("surface_max_size", "value"),
+    Input("surface_delta_size", "value"),
+    Input("surface_depth_percent", "value"),
+    Input("surface_flights", "value"),
+)
+@when_active("throughput")
+def show_surface(*args):
+    *params, flights = args
+    n_flights = tuple(int(n) for n in flights.split(","))
+    try:
+        params, notice = surface_policy.apply(params, SURFACE_RANGES, len(n_flights))
+        density, min_rpm, max_rpm, delta_rpm, min_size, max_size, delta_size, depth = (
+            params
+        )
+        size, rpm, throughput = surface_grid(
+            density,
+            min_size,
+            max_size,
+            delta_size,
+            min_rpm,
+            max_rpm,
+            delta_rpm,
+            depth,
+            n_flights,
+        )
+    except (GridTooLarge, TypeError, ValueError) as e:
+        return no_update, str(e)
+    return surface_output(size, rpm, throughput, n_flights), notice
+
+
+# Inputs of the tolerance analysis of a tab after its geometry (without prefix)
+TOLERANCE_INPUTS = [
+    "s_density",
+    "density_ratio",
+    "depth_percent",
+    "min_size",
+    "max_size",
+    "delta_size",
+    "tolerance_l_speed",
+    "tolerance_distribution",
+    "tolerance_s_density",
+    "tolerance_density_ratio",
+    "tolerance_depth_percent",
+    "tolerance_draws",
+]
+
+# Extruder sizes of the percentile bands (evenly thinned out)
+TOLERANCE_CHART_SIZES = 200
+
+
+def show_tolerance(tab):
+    """Callback of the tolerance analysis of a product tab"""
+    _, geometry = TAB_AREAS[tab]
+
+    def tolerance(*values):
+        (
+            s_density,
+            density_ratio,
+            depth_percent,
+            min_size,
+            max_size,
+            delta_size,
+            l_speed,
+            distribution,
+            *tolerances,
+            draws,
+        ) = values[len(geometry) :]
+        numbers = [v for v in values if not isinstance(v, str)]
+        if any(
+            not isinstance(v, (int, float)) or isinstance(v, bool) or v < 0
+            for v in numbers
+        ):
+            return no_update, html.P(
+                "Please enter non-negative values", style=notice_style
+            )
+        try:
+            area = product_area(tab, values[: len(geometry)])
+            sizes, notice = size_range(
+                min_size, max_size, delta_size, TOLERANCE_CHART_SIZES
+            )
+        except (TypeError, ValueError) as e:
+            return no_update, html.P(str(e), style=notice_style)
+        if area <= 0 or min(l_speed, min_size) <= 0:
+            return no_update, html.P(
+                "Please enter a product with a cross section, and positive line "
+                "speed and extruder sizes",
+                style=notice_style,
+            )
+
+        names = ["s_density", "density_ratio", "depth_percent"]
+        try:
+            bands, throughput = rpm_bands(
+                area,
+                l_speed,
+                sizes,
+                dict(zip(names, [s_density, density_ratio, depth_percent])),
+                dict(zip(names, tolerances)),
+                distribution,
+                draws,
+            )
+        except ToleranceError as e:
+            return no_update, html.P(str(e), style=notice_style)
+        return band_output(bands, l_speed, CHART_MODE), [
+            html.H6(
+                f"Required throughput over {int(draws):,} draws: "
+                f"{throughput[5]:,.1f} (p5) / {throughput[50]:,.1f} (p50) / "
+                f"{throughput[95]:,.1f} (p95) kg/hr"
+            ),
+            html.Div(notice, style=notice_style),
+        ]
+
+    tolerance.__name__ = f"show_{tab}_tolerance"
+    return tolerance
+
+
+# Setup callbacks/backend for the tolerance analysis of the product tabs
+for tab, (_, geometry) in TAB_AREAS.items():
+    app.callback(
+        Output(f"{tab}_tolerance_plot", CHART_PROPERTY),
+        Output(f"{tab}_tolerance_summary", "children"),
+        Input("tabs", "value"),
+        *[Input(id, "value") for id in geometry],
+        *[Input(f"{tab}_{name}", "value") for name in TOLERANCE_INPUTS],
+    )(when_active(tab)(show_tolerance(tab)))
+
+
+# Callback of each tab, called with the tab value, `TAB_INPUTS`, paging state and
+# the inputs of the displayed outputs for `INCREMENTAL_TABS` (preceded by
+# `set_progress` when `BACKGROUND`)
+TAB_CALLBACKS = {
+    "throughput": show_throughput,
+    "cable": show_cable,
+    "tube": show_tube,
+    "rod": show_rod,
+    "sheet": show_sheet,
+}
+
+
+def find_component(layout, id):
+    """Component with the given id in a layout tree, None if there is none"""
+    if getattr(layout, "id", None) == id:
+        return layout
+    children = getattr(layout, "children", None)
+    if not isinstance(children, (list, tuple)):
+        children = [children]
+    for child in children:
+        if hasattr(child, "to_plotly_json"):
+            found = find_component(child, id)
+            if found is not None:
+                return found
+    return None
+
+
+def default_inputs(tab):
+    """Values of the inputs of a tab as set in `app.layout`"""
+    return [find_component(app.layout, id).value for id in TAB_INPUTS[tab]]
+
+
+def default_paging(tab):
+    table = find_component(app.layout, f"{tab}_table")
+    if TABLE_MODE == "datatable":
+        return [table.page_current, table.page_size, table.sort_by]
+    return []
+
+
+def prerender(embed=False):
+    """
+    Computes the outputs of every tab for the default inputs, so that they are
+    served from the result cache, and optionally embeds them in `app.layout`
+
+    Returns the time spent per tab [s].
+    """
+    timings = {}
+    for tab, callback in TAB_CALLBACKS.items():
+        start = time.perf_counter()
+        progress = [None] if BACKGROUND else []
+        shown = [None] if tab in INCREMENTAL_TABS else []
+        outputs = callback(
+            *progress, tab, *default_inputs(tab), *default_paging(tab), *shown
+        )
+        timings[tab] = time.perf_counter() - start
+        if embed:
+            targets = [Output(f"{tab}_plot", CHART_PROPERTY)]
+            targets += table_outputs(f"{tab}_table")
+            if tab in INCREMENTAL_TABS:
+                targets += [Output(f"{tab}_shown", "data")]
+            targets += [Output(f"{tab}_notice", "children")]
+            for target, value in zip(targets, outputs):
+                component = find_component(app.layout, target.component_id)
+                setattr(component, target.component_property, value)
+    return timings
+
+
+# Modules loaded from here on are imported on first use
+startup.timer.stop()
+
+# Warm up before serving: with `gunicorn --preload` this runs once in the
+# master process, before the workers are forked and traffic is accepted
+prerender_timings = prerender(embed=EMBED_DEFAULTS) if PRERENDER else None
+
+if STARTUP_REPORT:
+    startup.report(prerender_timings)
+    # Import cost of each package, measured by another process once ready
+    startup.report_imports()
 
 
 if __name__ == "__main__":
-    app.run_server(debug=True)
\ No newline at end of file
+    app.run_server(debug=True)
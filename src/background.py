@@ -0,0 +1,106 @@
+"""
+Background execution of the tab callbacks
+
+With `EXTRUCAL_BACKGROUND=1`, the tab callbacks run as Dash background
+callbacks: each job runs in its own process, managed through a disk cache
+shared by the workers of a node, so that a large sweep doesn't hold a request
+worker for its whole duration. Dash terminates the running job of a callback
+when its inputs change again, so superseded sweeps are cancelled.
+
+While a job runs, the grids are evaluated block by block (`chunked`) and the
+progress is reported to a progress bar. The jobs only share their results
+through a disk or redis result cache, which the app requires.
+"""
+
+import inspect
+import math
+import os
+import tempfile
+from contextvars import ContextVar
+from functools import wraps
+
+from guardrails import estimate_cells
+
+# Rows of a grid evaluated between two progress reports
+CHUNK_ROWS = int(os.environ.get("EXTRUCAL_BACKGROUND_CHUNK_ROWS", 50))
+
+# `set_progress` of the running background job, None outside of a job
+PROGRESS = ContextVar("progress", default=None)
+
+
+def manager_from_env():
+    """Creates the Dash job manager configured by `EXTRUCAL_BACKGROUND_*`"""
+    # Only needed (and installed with dash[diskcache]) when enabled
+    import diskcache
+    from dash import DiskcacheManager
+
+    directory = os.environ.get(
+        "EXTRUCAL_BACKGROUND_DIR",
+        os.path.join(tempfile.gettempdir(), "extrucal_jobs"),
+    )
+    return DiskcacheManager(
+        diskcache.Cache(directory),
+        expire=int(os.environ.get("EXTRUCAL_BACKGROUND_EXPIRE", 600)),
+    )
+
+
+def report_progress(func):
+    """
+    Passes the `set_progress` function given to a background callback, as its
+    first argument, to the grids evaluated by the callback
+
+    `set_progress` may be None to call the callback outside of a job.
+    """
+
+    @wraps(func)
+    def wrapper(set_progress, *args):
+        token = PROGRESS.set(set_progress)
+        try:
+            return func(*args)
+        finally:
+            PROGRESS.reset(token)
+
+    return wrapper
+
+
+def chunked(grid, rows):
+    """
+    Evaluates `grid` block by block while a background job reports progress
+
+    Parameters
+    ----------
+    grid : function
+           One of the `*_grid` functions, accepting a `rows` slice (memoize
+           the result of `chunked`, so that the whole grid is cached rather
+           than its blocks)
+    rows : guardrails.GridRange
+           Range of the rows of the grid in the arguments of `grid`
+    """
+    signature = inspect.signature(grid)
+
+    @wraps(grid)
+    def wrapper(*args, **kwargs):
+        set_progress = PROGRESS.get()
+        if set_progress is None or kwargs.get("rows") is not None:
+            return grid(*args, **kwargs)
+
+        bound = signature.bind(*args, **kwargs)
+        bound.apply_defaults()
+        params = list(bound.arguments.values())
+        # Non-numeric or unbounded ranges are left to the input checks of the grid
+        total = estimate_cells(params, [rows])
+        if total is None or not math.isfinite(total) or total <= CHUNK_ROWS:
+            return grid(*args, **kwargs)
+
+        blocks = []
+        for start in range(0, total, CHUNK_ROWS):
+            kwargs["rows"] = (start, start + CHUNK_ROWS)
+            blocks.append(grid(*args, **kwargs))
+            done = min(start + CHUNK_ROWS, total)
+            set_progress((done, total, f"{done:,} / {total:,} {rows.label}s"))
+        set_progress((total, total, "Rendering"))
+        import pandas as pd
+
+        return pd.concat(blocks)
+
+    return wrapper
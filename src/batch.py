@@ -0,0 +1,324 @@
+"""
+Bulk evaluation of product specs uploaded to the "Batch" tab
+
+An uploaded CSV or XLSX holds one product per row (e.g. one cable per SKU).
+The rows are stored as a job on disk, and the download of the job evaluates
+them with the extrucal `*_cal` functions in chunks spread over a process pool,
+streaming the result CSV chunk by chunk instead of building it in a callback.
+extrucal (which loads Altair) and pandas are imported on first use.
+"""
+
+import base64
+import importlib
+import io
+import math
+import os
+import pickle
+import re
+import tempfile
+import time
+import uuid
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+
+from flask import Blueprint, Response, abort, stream_with_context
+
+# Required and optional (with their defaults) columns of each product
+PRODUCTS = {
+    "cable": (["outer_d", "thickness", "l_speed", "s_density"], {}),
+    "tube": (["outer_d", "inner_d", "l_speed", "s_density"], {}),
+    "rod": (["outer_d", "l_speed", "s_density"], {"n_holes": 1}),
+    "sheet": (["width", "thickness", "l_speed", "s_density"], {}),
+}
+
+# extrucal `*_cal` function of each product (module, name)
+CALCULATORS = {
+    "cable": ("extrucal.cable_extrusion", "cable_cal"),
+    "tube": ("extrucal.tube_extrusion", "tube_cal"),
+    "rod": ("extrucal.rod_extrusion", "rod_cal"),
+    "sheet": ("extrucal.sheet_extrusion", "sheet_cal"),
+}
+
+# Optional columns to get the screw RPM required on a given extruder size
+EXTRUDER_COLUMNS = {"size": None, "density_ratio": 0.85, "depth_percent": 0.05}
+
+BATCH_DIR = os.environ.get(
+    "EXTRUCAL_BATCH_DIR", os.path.join(tempfile.gettempdir(), "extrucal_batch")
+)
+MAX_ROWS = int(os.environ.get("EXTRUCAL_BATCH_MAX_ROWS", 100_000))
+CHUNK_ROWS = int(os.environ.get("EXTRUCAL_BATCH_CHUNK_ROWS", 1000))
+# Uploaded jobs are kept on disk (and can be downloaded again) for this long [s]
+JOB_TTL = int(os.environ.get("EXTRUCAL_BATCH_TTL", 3600))
+
+TOKEN = re.compile(r"^[0-9a-f]{32}$")
+
+
+class BatchError(ValueError):
+    """Raised for an upload that can't be evaluated"""
+
+
+def available_cores():
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+WORKERS = int(os.environ.get("EXTRUCAL_BATCH_WORKERS", 0)) or available_cores()
+
+
+# Reading the uploads
+def read_upload(contents, filename):
+    """
+    Product specs of a file sent by `dcc.Upload`
+
+    Parameters
+    ----------
+    contents : str
+               "data:<type>;base64,<data>" string of the upload
+    filename : str
+               Name of the uploaded file (".csv", ".xlsx" or ".xls")
+
+    Returns
+    -------
+    table : pandas.DataFrame
+            one row per product, column names stripped and in lower case
+    """
+    import pandas as pd
+
+    extension = os.path.splitext(filename or "")[1].lower()
+    errors = (ValueError, UnicodeDecodeError)
+    try:
+        data = base64.b64decode(contents.split(",", 1)[-1])
+        if extension == ".csv":
+            table = pd.read_csv(io.BytesIO(data))
+        elif extension in (".xlsx", ".xls"):
+            errors += excel_errors()
+            table = pd.read_excel(io.BytesIO(data))
+        else:
+            raise BatchError("Please upload a .csv or .xlsx file")
+    except ImportError:
+        raise BatchError("Reading Excel files requires the openpyxl package")
+    except BatchError:
+        raise
+    except errors as e:
+        raise BatchError(f"Couldn't read {filename}: {e}")
+    table.columns = [str(c).strip().lower() for c in table.columns]
+    return table
+
+
+def excel_errors():
+    """Exceptions raised by openpyxl for a file that isn't a valid workbook"""
+    from openpyxl.utils.exceptions import InvalidFileException
+
+    # Not a zip archive, missing parts (KeyError, OSError) or malformed XML
+    return (zipfile.BadZipFile, InvalidFileException, KeyError, OSError, SyntaxError)
+
+
+def check_upload(kind, table):
+    """Raises BatchError when `table` can't be evaluated as `kind` products"""
+    required, _ = PRODUCTS[kind]
+    missing = [c for c in required if c not in table.columns]
+    if missing:
+        raise BatchError(f"Missing column(s) for {kind}: {', '.join(missing)}")
+    if table.empty:
+        raise BatchError("The uploaded file has no rows")
+    if len(table) > MAX_ROWS:
+        raise BatchError(f"At most {MAX_ROWS:,} rows per upload")
+
+
+# Evaluation
+def spec_columns(kind, table):
+    """Columns of `table` used by the evaluation of `kind` products"""
+    required, optional = PRODUCTS[kind]
+    columns = required + list(optional) + list(EXTRUDER_COLUMNS)
+    return [c for c in columns if c in table.columns]
+
+
+def numeric_specs(table, columns):
+    """
+    Spec columns of `table` converted to numbers, cell by cell
+
+    A single text cell makes pandas read its whole column as text. The
+    numbers of such a column are converted back, and the cells that aren't
+    numbers are kept as read, so that only their rows report an error.
+    """
+    import pandas as pd
+
+    specs = {}
+    for name in columns:
+        values = table[name]
+        numbers = pd.to_numeric(values, errors="coerce")
+        specs[name] = numbers.astype(object).where(
+            numbers.notna() | values.isna(), values
+        )
+    return pd.DataFrame(specs, index=table.index)
+
+
+def is_missing(value):
+    return value is None or (isinstance(value, float) and math.isnan(value))
+
+
+def scalar(name, value, default=None):
+    if is_missing(value):
+        if default is None:
+            raise ValueError(f"Missing value of '{name}'")
+        return default
+    if isinstance(value, str):
+        raise ValueError(f"'{name}' should be a number, not {value!r}")
+    # Integer columns with blanks are read as floats
+    if name == "n_holes" and isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+@lru_cache(maxsize=1024)
+def extruder_throughput(size, depth_percent, density):
+    """Throughput of an extruder at 1 RPM, shared by the specs run on it"""
+    from extrucal.extrusion import throughput_cal
+
+    # Same rounding as the RPM tables of the dashboard
+    return round(throughput_cal(size, size * depth_percent, density), 2)
+
+
+def evaluate_spec(kind, spec):
+    """
+    Required throughput [kg/hr] of one product, and the screw RPM it needs on
+    the extruder of the "size" column (None without one)
+    """
+    required, optional = PRODUCTS[kind]
+    module, name = CALCULATORS[kind]
+    cal = getattr(importlib.import_module(module), name)
+    kwargs = {name: scalar(name, spec.get(name)) for name in required}
+    for name, default in optional.items():
+        kwargs[name] = scalar(name, spec.get(name), default)
+    req_throughput = cal(**kwargs)
+
+    if is_missing(spec.get("size")):
+        return req_throughput, None
+    size, density_ratio, depth_percent = (
+        scalar(name, spec.get(name), default)
+        for name, default in EXTRUDER_COLUMNS.items()
+    )
+    throughput = extruder_throughput(
+        size, depth_percent, kwargs["s_density"] * density_ratio
+    )
+    return req_throughput, round(req_throughput / throughput, 2)
+
+
+def evaluate_chunk(kind, specs):
+    """Evaluates a list of specs, run in the workers of the process pool"""
+    results = []
+    for spec in specs:
+        try:
+            results.append((*evaluate_spec(kind, spec), ""))
+        except (TypeError, ValueError, ZeroDivisionError) as e:
+            results.append((None, None, str(e)))
+    return results
+
+
+_pool = None
+_pool_pid = None
+
+
+def pool():
+    """Process pool of the current process (created on first use, after fork)"""
+    global _pool, _pool_pid
+    if _pool is None or _pool_pid != os.getpid():
+        _pool = ProcessPoolExecutor(max_workers=WORKERS)
+        _pool_pid = os.getpid()
+    return _pool
+
+
+def evaluate(kind, table, chunk_rows=CHUNK_ROWS):
+    """
+    Yields the result of each chunk of `table`, in order
+
+    Each chunk is the rows of `table` with "req_throughput", "req_rpm" and
+    "error" columns appended. Chunks are evaluated in parallel by the process pool,
+    unless there is a single one.
+    """
+    numbers = numeric_specs(table, spec_columns(kind, table))
+    chunks = [table.iloc[i : i + chunk_rows] for i in range(0, len(table), chunk_rows)]
+    specs = [
+        numbers.iloc[i : i + chunk_rows].to_dict("records")
+        for i in range(0, len(table), chunk_rows)
+    ]
+    if len(chunks) > 1 and WORKERS > 1:
+        results = pool().map(evaluate_chunk, [kind] * len(specs), specs)
+    else:
+        results = (evaluate_chunk(kind, s) for s in specs)
+    for chunk, result in zip(chunks, results):
+        throughput, rpm, error = zip(*result)
+        yield chunk.assign(req_throughput=throughput, req_rpm=rpm, error=error)
+
+
+# Jobs
+def job_path(token):
+    return os.path.join(BATCH_DIR, f"{token}.pkl")
+
+
+def save_job(kind, table, filename):
+    """Stores an upload until its results are downloaded, returns its token"""
+    os.makedirs(BATCH_DIR, exist_ok=True)
+    prune_jobs()
+    token = uuid.uuid4().hex
+    temp = job_path(token) + f".{os.getpid()}.tmp"
+    with open(temp, "wb") as f:
+        pickle.dump((kind, table, filename), f, pickle.HIGHEST_PROTOCOL)
+    os.replace(temp, job_path(token))
+    return token
+
+
+def load_job(token):
+    """Kind, table and file name of a job, None if there is no such job"""
+    if not TOKEN.match(token):
+        return None
+    try:
+        with open(job_path(token), "rb") as f:
+            return pickle.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def prune_jobs():
+    now = time.time()
+    for entry in os.scandir(BATCH_DIR):
+        try:
+            if now - entry.stat().st_mtime > JOB_TTL:
+                os.remove(entry.path)
+        except FileNotFoundError:
+            pass
+
+
+def result_name(filename, kind):
+    stem = os.path.splitext(os.path.basename(filename or ""))[0] or kind
+    return f"{stem}_results.csv"
+
+
+def create_download():
+    """Blueprint streaming the results of the batch jobs as CSV"""
+    download = Blueprint("batch", __name__, url_prefix="/batch")
+
+    @download.get("/<token>.csv")
+    def results(token):
+        job = load_job(token)
+        if job is None:
+            abort(404)
+        kind, table, filename = job
+
+        def chunks():
+            for i, chunk in enumerate(evaluate(kind, table)):
+                yield chunk.to_csv(header=i == 0, index=False)
+
+        return Response(
+            stream_with_context(chunks()),
+            mimetype="text/csv",
+            headers={
+                "Content-Disposition": "attachment; "
+                f'filename="{result_name(filename, kind)}"'
+            },
+        )
+
+    return download
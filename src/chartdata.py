@@ -0,0 +1,126 @@
+"""
+Data of the large Altair charts, served by URL instead of inlined
+
+Altair refuses to inline more than 5000 rows in a chart (`MaxRowsError`), and
+inlined rows end up in the `srcDoc` of the chart's iframe. The data
+transformer below inlines the small charts as before, and writes the data of
+the larger ones as JSON to `EXTRUCAL_CHART_DATA_DIR` (shared by the workers of
+a node, like the batch jobs), where the chart fetches it from
+`/chart-data/<digest>.json`. The files are named after the digest of their
+content, so identical charts share a file and the browser can cache it.
+
+Rendered charts can outlive their data in the result cache, so the outputs
+served from the cache are passed to `refresh`, which keeps their data files
+or tells that they must be rendered again.
+"""
+
+import hashlib
+import json
+import os
+import re
+import tempfile
+import time
+
+from flask import Blueprint, abort, send_file
+
+CHART_DATA_DIR = os.environ.get(
+    "EXTRUCAL_CHART_DATA_DIR", os.path.join(tempfile.gettempdir(), "extrucal_charts")
+)
+# Chart data is kept on disk for this long after its last chart [s]
+DATA_TTL = int(os.environ.get("EXTRUCAL_CHART_DATA_TTL", 3600))
+# Largest chart whose data is inlined (Altair's own limit)
+MAX_INLINE_ROWS = int(os.environ.get("EXTRUCAL_CHART_INLINE_ROWS", 5000))
+
+URL_PREFIX = "/chart-data"
+
+DIGEST = re.compile(r"^[0-9a-f]{40}$")
+DATA_URL = re.compile(URL_PREFIX + r"/([0-9a-f]{40})\.json")
+
+
+def data_path(digest):
+    return os.path.join(CHART_DATA_DIR, f"{digest}.json")
+
+
+def publish(values):
+    """Stores the rows of a chart, returns their URL"""
+    body = json.dumps(values, separators=(",", ":")).encode()
+    digest = hashlib.sha1(body).hexdigest()
+    path = data_path(digest)
+    os.makedirs(CHART_DATA_DIR, exist_ok=True)
+    prune_data()
+    if os.path.exists(path):
+        os.utime(path)
+    else:
+        temp = path + f".{os.getpid()}.tmp"
+        with open(temp, "wb") as f:
+            f.write(body)
+        os.replace(temp, path)
+    return f"{URL_PREFIX}/{digest}.json"
+
+
+def prune_data():
+    now = time.time()
+    for entry in os.scandir(CHART_DATA_DIR):
+        try:
+            if now - entry.stat().st_mtime > DATA_TTL:
+                os.remove(entry.path)
+        except FileNotFoundError:
+            pass
+
+
+def refresh(outputs):
+    """
+    Refreshes the data files linked by rendered callback outputs
+
+    Returns
+    -------
+    found : bool
+            False when one of the files was removed (or published on another
+            node), so that the outputs are rendered again
+    """
+    if isinstance(outputs, (list, tuple)):
+        return all([refresh(output) for output in outputs])
+    if isinstance(outputs, dict):
+        return all([refresh(output) for output in outputs.values()])
+    if not isinstance(outputs, str) or URL_PREFIX not in outputs:
+        return True
+    found = True
+    for digest in set(DATA_URL.findall(outputs)):
+        try:
+            os.utime(data_path(digest))
+        except FileNotFoundError:
+            found = False
+    return found
+
+
+def chart_data(data):
+    """
+    Altair data transformer inlining the rows of the small charts, and
+    publishing those of the large ones
+    """
+    import altair as alt
+
+    values = alt.to_values(data)
+    if len(values["values"]) <= MAX_INLINE_ROWS:
+        return values
+    return {"url": publish(values["values"]), "format": {"type": "json"}}
+
+
+def create_chart_data():
+    """Blueprint serving the published chart data"""
+    blueprint = Blueprint("chart_data", __name__, url_prefix=URL_PREFIX)
+
+    @blueprint.get("/<digest>.json")
+    def data(digest):
+        if not DIGEST.match(digest):
+            abort(404)
+        try:
+            return send_file(
+                data_path(digest),
+                mimetype="application/json",
+                max_age=DATA_TTL,
+            )
+        except FileNotFoundError:
+            abort(404)
+
+    return blueprint
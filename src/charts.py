@@ -0,0 +1,402 @@
+"""
+Charts of the dashboard, built from the grids computed by `engine`
+
+Each chart can be rendered in two modes:
+
+- "altair": standalone Vega-Lite HTML document for an `html.Iframe` srcDoc
+- "plotly": Plotly figure (JSON-serializable dict) for a `dcc.Graph`
+
+The series of the grids are downsampled to `decimation.MAX_POINTS` points
+before they are charted (the tables keep all the rows). The Altair charts that
+remain larger than Altair's inline limit fetch their data from the server
+(see `chartdata`) instead of failing with `MaxRowsError`.
+
+Altair and Plotly are imported by the functions that use them, so that only
+the library of the configured mode is loaded, on the first chart.
+"""
+
+from chartdata import chart_data
+from decimation import MAX_POINTS, keep_mask
+from engine import rpm_axis, size_axis, speed_axis
+
+CHART_MODES = ("altair", "plotly")
+
+FONT = "Century Gothic, sans-serif"
+
+
+# Long-form chart data
+def throughput_data(table, min_rpm, max_rpm, delta_rpm, max_points=MAX_POINTS):
+    """Melts the table returned by `throughput_grid` into RPM/depth/throughput"""
+    table_for_plot = table.copy()
+    table_for_plot.index = rpm_axis(min_rpm, max_rpm, delta_rpm)
+    table_for_plot.columns = [float(c.split("=")[1]) for c in table.columns]
+    table_for_plot = table_for_plot.reset_index()
+    table_for_plot = table_for_plot.rename(columns={"index": "RPM"})
+    table_for_plot = table_for_plot.melt(
+        id_vars="RPM", var_name="depth", value_name="throughput"
+    )
+    table_for_plot = table_for_plot[keep_mask(table, max_points).ravel(order="F")]
+    table_for_plot["depth"] = table_for_plot["depth"].astype("category")
+    return table_for_plot
+
+
+def rpm_data(
+    table,
+    min_l_speed,
+    max_l_speed,
+    delta_l_speed,
+    min_size,
+    max_size,
+    delta_size,
+    max_points=MAX_POINTS,
+):
+    """
+    Melts the table returned by `cable_grid`, `tube_grid`, `rod_grid` or
+    `sheet_grid` into size/speed/rpm
+    """
+    table_for_plot = table.copy()
+    table_for_plot.index = size_axis(min_size, max_size, delta_size)
+    table_for_plot.columns = speed_axis(min_l_speed, max_l_speed, delta_l_speed)
+    table_for_plot = table_for_plot.reset_index()
+    table_for_plot = table_for_plot.rename(columns={"index": "size"})
+    table_for_plot = table_for_plot.melt(
+        id_vars="size", var_name="speed", value_name="rpm"
+    )
+    table_for_plot = table_for_plot[keep_mask(table, max_points).ravel(order="F")]
+    table_for_plot["speed"] = table_for_plot["speed"].astype("category")
+    return table_for_plot
+
+
+# Altair charts
+def altair():
+    """Altair, with the data of the charts passed through `chart_data`"""
+    import altair as alt
+
+    if alt.data_transformers.active != "extrucal":
+        alt.data_transformers.register("extrucal", chart_data)
+        alt.data_transformers.enable("extrucal")
+    return alt
+
+
+def throughput_chart(data, max_rpm):
+    alt = altair()
+
+    return (
+        alt.Chart(data, title="Throughput vs Screw RPM & Channel Depth")
+        .mark_circle()
+        .encode(
+            alt.X("RPM", title="Screw RPM", scale=alt.Scale(domain=(0, max_rpm))),
+            alt.Y("throughput", title="Throughput [kg/hr]"),
+            alt.Color(
+                "depth",
+                title="Channel depth [mm]",
+                sort=alt.EncodingSortField("throughput", op="mean", order="descending"),
+            ),
+            tooltip=["RPM", "depth", "throughput"],
+        )
+        .configure_axis(labelFontSize=14, titleFontSize=16)
+        .configure_legend(labelFontSize=16, titleFontSize=14)
+        .configure_title(fontSize=18)
+    )
+
+
+def rpm_chart(data, min_size, max_size):
+    alt = altair()
+
+    return (
+        alt.Chart(data, title="Screw RPM vs Extruder Size & Line Speed")
+        .mark_line()
+        .encode(
+            alt.X(
+                "size",
+                title="Extruder Size",
+                scale=alt.Scale(domain=(min_size, max_size)),
+            ),
+            alt.Y("rpm", title="Screw RPM"),
+            alt.Color(
+                "speed",
+                title="Line Speed [mpm]",
+                sort=alt.EncodingSortField("rpm", op="mean", order="descending"),
+            ),
+            tooltip=["size", "speed", "rpm"],
+        )
+        .configure_axis(labelFontSize=14, titleFontSize=16)
+        .configure_legend(labelFontSize=16, titleFontSize=14)
+        .configure_title(fontSize=18)
+    )
+
+
+def band_chart(data, l_speed):
+    """Percentile bands of the required RPM (columns of `tolerance.rpm_bands`)"""
+    alt = altair()
+
+    base = alt.Chart(
+        data, title=f"Screw RPM Percentiles vs Extruder Size at {l_speed:g} mpm"
+    ).encode(alt.X("size", title="Extruder Size"))
+    tooltip = ["size", "p5", "p25", "p50", "p75", "p95"]
+    return (
+        alt.layer(
+            base.mark_area(opacity=0.25).encode(
+                alt.Y("p5", title="Screw RPM"), alt.Y2("p95"), tooltip=tooltip
+            ),
+            base.mark_area(opacity=0.45).encode(
+                alt.Y("p25"), alt.Y2("p75"), tooltip=tooltip
+            ),
+            base.mark_line().encode(alt.Y("p50"), tooltip=tooltip),
+        )
+        .configure_axis(labelFontSize=14, titleFontSize=16)
+        .configure_title(fontSize=18)
+    )
+
+
+# Plotly figures
+def figure_layout(title, x_title, y_title, legend_title, x_range):
+    import plotly.graph_objects as go
+
+    return go.Layout(
+        title={"text": title, "font": {"size": 18}},
+        xaxis={
+            "title": {"text": x_title, "font": {"size": 16}},
+            "tickfont": {"size": 14},
+            "range": x_range,
+            "gridcolor": "#EBEBEB",
+        },
+        yaxis={
+            "title": {"text": y_title, "font": {"size": 16}},
+            "tickfont": {"size": 14},
+            "gridcolor": "#EBEBEB",
+        },
+        legend={
+            "title": {"text": legend_title, "font": {"size": 14}},
+            "font": {"size": 16},
+        },
+        font={"family": FONT},
+        plot_bgcolor="white",
+        template="none",
+        margin={"l": 60, "r": 20, "t": 60, "b": 50},
+    )
+
+
+def throughput_figure(data, max_rpm):
+    """Plotly version of `throughput_chart`, series sorted by mean throughput"""
+    import plotly.graph_objects as go
+
+    groups = data.groupby("depth", observed=True)
+    order = groups["throughput"].mean().sort_values(ascending=False).index
+    figure = go.Figure(
+        layout=figure_layout(
+            "Throughput vs Screw RPM & Channel Depth",
+            "Screw RPM",
+            "Throughput [kg/hr]",
+            "Channel depth [mm]",
+            [0, max_rpm],
+        )
+    )
+    for depth in order:
+        series = groups.get_group(depth)
+        figure.add_trace(
+            go.Scatter(
+                x=series["RPM"].tolist(),
+                y=series["throughput"].tolist(),
+                mode="markers",
+                name=str(depth),
+                hovertemplate=(
+                    f"RPM=%{{x}}<br>depth={depth}<br>throughput=%{{y}}"
+                    "<extra></extra>"
+                ),
+            )
+        )
+    return figure
+
+
+def rpm_figure(data, min_size, max_size):
+    """Plotly version of `rpm_chart`, series sorted by mean RPM"""
+    import plotly.graph_objects as go
+
+    groups = data.groupby("speed", observed=True)
+    order = groups["rpm"].mean().sort_values(ascending=False).index
+    figure = go.Figure(
+        layout=figure_layout(
+            "Screw RPM vs Extruder Size & Line Speed",
+            "Extruder Size",
+            "Screw RPM",
+            "Line Speed [mpm]",
+            [min_size, max_size],
+        )
+    )
+    for speed in order:
+        series = groups.get_group(speed)
+        figure.add_trace(
+            rpm_trace(series["size"].tolist(), series["rpm"].tolist(), speed)
+        )
+    return figure
+
+
+def rpm_trace(size, rpm, speed):
+    import plotly.graph_objects as go
+
+    return go.Scatter(
+        x=size,
+        y=rpm,
+        mode="lines",
+        name=str(speed),
+        hovertemplate=f"size=%{{x}}<br>speed={speed}<br>rpm=%{{y}}<extra></extra>",
+    )
+
+
+def rpm_patch(extra, axis, min_size, max_size, delta_size):
+    """
+    `Patch` of an `rpm_figure` (not downsampled) for the new rows or columns
+    `extra` of its grid
+
+    The required RPM is proportional to the line speed, so the series of
+    `rpm_figure` are in order of decreasing line speed: new extruder sizes
+    extend every series, and new (faster) line speeds come first.
+    """
+    from dash import Patch
+
+    patch = Patch()
+    size = size_axis(min_size, max_size, delta_size).tolist()
+    if axis == "rows":
+        for i, column in enumerate(reversed(extra.columns)):
+            patch["data"][i]["x"].extend(size[-len(extra) :])
+            patch["data"][i]["y"].extend(extra[column].tolist())
+        patch["layout"]["xaxis"]["range"] = [min_size, max_size]
+    else:
+        speeds = [float(c[: -len("mpm")]) for c in extra.columns]
+        for speed, column in zip(speeds, extra.columns):
+            patch["data"].prepend(
+                rpm_trace(size, extra[column].tolist(), speed).to_plotly_json()
+            )
+    return patch
+
+
+def band_figure(data, l_speed):
+    """Plotly version of `band_chart`"""
+    import plotly.graph_objects as go
+
+    figure = go.Figure(
+        layout=figure_layout(
+            f"Screw RPM Percentiles vs Extruder Size at {l_speed:g} mpm",
+            "Extruder Size",
+            "Screw RPM",
+            "Percentiles",
+            [data["size"].min(), data["size"].max()],
+        )
+    )
+    size = data["size"].tolist()
+    for low, high, opacity in [("p5", "p95", 0.25), ("p25", "p75", 0.45)]:
+        figure.add_trace(
+            go.Scatter(
+                x=size,
+                y=data[high].tolist(),
+                mode="lines",
+                line={"width": 0},
+                showlegend=False,
+                hovertemplate=f"size=%{{x}}<br>{high}=%{{y}}<extra></extra>",
+            )
+        )
+        figure.add_trace(
+            go.Scatter(
+                x=size,
+                y=data[low].tolist(),
+                mode="lines",
+                line={"width": 0},
+                fill="tonexty",
+                fillcolor=f"rgba(31, 119, 180, {opacity})",
+                name=f"{low}-{high}",
+                hovertemplate=f"size=%{{x}}<br>{low}=%{{y}}<extra></extra>",
+            )
+        )
+    figure.add_trace(
+        go.Scatter(
+            x=size,
+            y=data["p50"].tolist(),
+            mode="lines",
+            line={"color": "rgb(31, 119, 180)"},
+            name="median",
+            hovertemplate="size=%{x}<br>p50=%{y}<extra></extra>",
+        )
+    )
+    return figure
+
+
+def surface_figure(size, rpm, throughput, n_flights):
+    """
+    Heatmap of the throughput over screw sizes x RPMs, one panel per flight
+    count (Plotly only, whatever the chart mode)
+
+    The values are sent as float32 typed arrays, and the heatmap is drawn as a
+    single image, so that grids of several 100k cells stay responsive.
+    """
+    import numpy as np
+    import plotly.graph_objects as go
+    from plotly.subplots import make_subplots
+
+    figure = make_subplots(
+        rows=1,
+        cols=len(n_flights),
+        shared_yaxes=True,
+        horizontal_spacing=0.03,
+        subplot_titles=[f"{n} flight{'s' if n > 1 else ''}" for n in n_flights],
+    )
+    for i, n_flight in enumerate(n_flights):
+        figure.add_trace(
+            go.Heatmap(
+                x=rpm.astype(np.float32),
+                y=size.astype(np.float32),
+                z=throughput[i].astype(np.float32),
+                coloraxis="coloraxis",
+                hovertemplate=(
+                    "RPM=%{x}<br>size=%{y}<br>throughput=%{z}<extra></extra>"
+                ),
+            ),
+            row=1,
+            col=i + 1,
+        )
+        figure.update_xaxes(title_text="Screw RPM", row=1, col=i + 1)
+    figure.update_yaxes(title_text="Screw Size [mm]", row=1, col=1)
+    figure.update_layout(
+        title={"text": "Throughput vs Screw Size & Screw RPM", "font": {"size": 18}},
+        coloraxis={"colorbar": {"title": {"text": "Throughput [kg/hr]"}}},
+        font={"family": FONT},
+        template="none",
+        margin={"l": 60, "r": 20, "t": 80, "b": 50},
+    )
+    return figure
+
+
+# Chart outputs of the callbacks
+def throughput_output(table, min_rpm, max_rpm, delta_rpm, mode="altair"):
+    data = throughput_data(table, min_rpm, max_rpm, delta_rpm)
+    if mode == "plotly":
+        return throughput_figure(data, max_rpm).to_plotly_json()
+    return throughput_chart(data, max_rpm).to_html()
+
+
+def rpm_output(
+    table,
+    min_l_speed,
+    max_l_speed,
+    delta_l_speed,
+    min_size,
+    max_size,
+    delta_size,
+    mode="altair",
+):
+    data = rpm_data(
+        table, min_l_speed, max_l_speed, delta_l_speed, min_size, max_size, delta_size
+    )
+    if mode == "plotly":
+        return rpm_figure(data, min_size, max_size).to_plotly_json()
+    return rpm_chart(data, min_size, max_size).to_html()
+
+
+def band_output(data, l_speed, mode="altair"):
+    if mode == "plotly":
+        return band_figure(data, l_speed).to_plotly_json()
+    return band_chart(data, l_speed).to_html()
+
+
+def surface_output(size, rpm, throughput, n_flights):
+    return surface_figure(size, rpm, throughput, n_flights).to_plotly_json()
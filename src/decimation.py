@@ -0,0 +1,65 @@
+"""
+Downsampling of the series of the charts
+
+The grids have one series per column (channel depth or line speed) over the
+rows (screw RPMs or extruder sizes). Fine increments give series of thousands
+of points, far more than the chart has pixels, and every point is embedded in
+the chart. Each series is cut into equal buckets along the rows, and only the
+minimum and the maximum of each bucket (and the ends of the series) are
+charted, so that the chart keeps the shape and the extremes of the series
+while its number of points stays under a target, however fine the sweep.
+
+Only the charts are downsampled: the tables keep all the rows.
+"""
+
+import os
+
+import numpy as np
+
+# Target number of points of a chart (0 to chart every point)
+MAX_POINTS = int(os.environ.get("EXTRUCAL_CHART_MAX_POINTS", 4000))
+
+
+def decimated(n_rows, n_series, max_points=MAX_POINTS):
+    """True when a grid of `n_rows` x `n_series` is charted with fewer points"""
+    return max_points > 0 and n_rows > max(max_points // max(n_series, 1), 4)
+
+
+def keep_mask(values, max_points=MAX_POINTS):
+    """
+    Points of a grid to chart
+
+    Parameters
+    ----------
+    values     : array-like
+                 Grid of rows x series (the values of a table)
+    max_points : int
+                 Target number of points over all the series
+
+    Returns
+    -------
+    mask : numpy.ndarray
+           Boolean array of the shape of `values`, True for the points kept
+    """
+    values = np.asarray(values, dtype=float)
+    n_rows, n_series = values.shape
+    if not decimated(n_rows, n_series, max_points):
+        return np.ones(values.shape, dtype=bool)
+
+    # Two points (minimum and maximum) per bucket of `size` rows, the last
+    # bucket padded with values that are never picked
+    n_buckets = max(max_points // max(n_series, 1) // 2, 1)
+    size = -(-n_rows // n_buckets)
+    n_buckets = -(-n_rows // size)
+    pad = ((0, n_buckets * size - n_rows), (0, 0))
+    missing = np.isnan(values)
+    low = np.pad(np.where(missing, np.inf, values), pad, constant_values=np.inf)
+    high = np.pad(np.where(missing, -np.inf, values), pad, constant_values=-np.inf)
+    start = np.arange(n_buckets)[:, np.newaxis] * size
+    series = np.arange(n_series)[np.newaxis, :]
+
+    mask = np.zeros(values.shape, dtype=bool)
+    mask[start + low.reshape(n_buckets, size, n_series).argmin(axis=1), series] = True
+    mask[start + high.reshape(n_buckets, size, n_series).argmax(axis=1), series] = True
+    mask[[0, -1], :] = True
+    return mask
@@ -0,0 +1,630 @@
+"""
+Vectorized versions of the extrucal grid calculations
+
+The `*_table` functions of extrucal fill the line speed x extruder size grid
+cell by cell through the scalar `*_cal` functions. The functions below evaluate
+the same relationships with a single NumPy broadcast over both axes and return
+the same DataFrame (values, rounding, row and column labels) as the extrucal
+functions they replace.
+
+pandas is imported when the first grid is built, not with this module.
+"""
+
+import numpy as np
+
+# Odd terms of the series used for the shape factor of drag flow
+SHAPE_FACTOR_TERMS = np.arange(1, 26, 2)
+
+
+# Input checks (same rules and messages as extrucal)
+def check_number(name, value):
+    if not isinstance(value, (int, float)) or isinstance(value, bool):
+        raise TypeError(f"'{name}' should be either integer or float")
+
+
+def check_integer(name, value):
+    if not isinstance(value, int) or isinstance(value, bool):
+        raise TypeError(f"'{name}' should be integer")
+
+
+# Range of the screw sizes accepted by extrucal [mm]
+MIN_SCREW_SIZE = 5
+MAX_SCREW_SIZE = 500
+
+
+def check_screw(size, density, pitch, w_flight, n_flight):
+    if np.min(size) < MIN_SCREW_SIZE:
+        raise ValueError("Screw size is too small!!")
+    if np.max(size) > MAX_SCREW_SIZE:
+        raise ValueError("Screw size is too big!!")
+    if density < 300:
+        raise ValueError("This is not melt density for polymers. Too low!!")
+    if density > 3000:
+        raise ValueError("This is not melt density for polymers. Too high!!")
+    if pitch is not None and np.min(pitch / size) < 0.2:
+        raise ValueError("Screw pitch is too small")
+    if pitch is not None and np.max(pitch / size) > 2.5:
+        raise ValueError("Screw pitch is too big")
+    if w_flight is not None and np.min(w_flight / size) < 0.01:
+        raise ValueError("Flight width is too small")
+    if w_flight is not None and np.max(w_flight / size) > 0.7:
+        raise ValueError("Flight width is too big")
+    if n_flight not in [1, 2]:
+        raise ValueError(
+            "You chose wrong value for n_flight. It should be either 1 or 2"
+        )
+
+
+def check_rpm_grid(
+    s_density,
+    density_ratio,
+    min_l_speed,
+    max_l_speed,
+    delta_l_speed,
+    min_size,
+    max_size,
+    delta_size,
+    depth_percent,
+):
+    for name, value in [
+        ("s_density", s_density),
+        ("density_ratio", density_ratio),
+        ("min_l_speed", min_l_speed),
+        ("max_l_speed", max_l_speed),
+        ("delta_l_speed", delta_l_speed),
+        ("min_size", min_size),
+        ("max_size", max_size),
+        ("delta_size", delta_size),
+        ("depth_percent", depth_percent),
+    ]:
+        check_number(name, value)
+
+    check_material(s_density, density_ratio)
+    if delta_l_speed > max_l_speed - min_l_speed:
+        raise ValueError(
+            "'delta_l_speed' can not be greater than 'max_l_speed - min_l_speed'"
+        )
+    if delta_size > max_size - min_size:
+        raise ValueError("'delta_size' can not be greater than 'max_size - min_size'")
+    check_depth(depth_percent)
+    check_screw(
+        np.array([min_size, max_size]), s_density * density_ratio, None, None, 1
+    )
+
+
+# Material and screw checks of the RPM grids, shared by the inverse mode and
+# the tolerance analysis
+def check_material(s_density, density_ratio):
+    if s_density < 300:
+        raise ValueError("This is not solid density for polymers. Too low!!")
+    if s_density > 3000:
+        raise ValueError("This is not solid density for polymers. Too high!!")
+    if density_ratio > 1:
+        raise ValueError("Melt density can't be greater than solid density")
+    if density_ratio < 0.5:
+        raise ValueError("Melt density is too low (<50% of solid density)")
+
+
+def check_depth(depth_percent):
+    if depth_percent < 0.01:
+        raise ValueError(
+            "Channel depth is too shallow(<1% of screw size) to be used for extrusion screw"
+        )
+    if depth_percent > 0.3:
+        raise ValueError(
+            "Channel depth is too deep(>30% of screw size) to be used for extrusion screw"
+        )
+
+
+# Geometry checks of the products (same as the extrucal `*_cal` functions)
+def check_cable(outer_d, thickness):
+    check_number("outer_d", outer_d)
+    check_number("thickness", thickness)
+    if thickness > outer_d / 2:
+        raise ValueError("Thickness can't be greater than radius")
+
+
+def check_tube(outer_d, inner_d):
+    check_number("outer_d", outer_d)
+    check_number("inner_d", inner_d)
+    if inner_d > outer_d:
+        raise ValueError("'inner_d' can't be greater than 'outer_d'")
+
+
+def check_rod(outer_d, n_holes=1):
+    check_number("outer_d", outer_d)
+    check_integer("n_holes", n_holes)
+
+
+def check_sheet(width, thickness):
+    check_number("width", width)
+    check_number("thickness", thickness)
+
+
+# Axes (same sampling as extrucal, which adds these pads to the maximum)
+SPEED_PAD = 0.001
+SIZE_PAD = 0.1
+RPM_PAD = 0.1
+DEPTH_PAD = 0.1
+
+
+def speed_axis(min_l_speed, max_l_speed, delta_l_speed):
+    return np.round(np.arange(min_l_speed, max_l_speed + SPEED_PAD, delta_l_speed), 2)
+
+
+def size_axis(min_size, max_size, delta_size):
+    return np.arange(min_size, max_size + SIZE_PAD, delta_size)
+
+
+def rpm_axis(min_rpm, max_rpm, delta_rpm):
+    return np.arange(min_rpm, max_rpm + RPM_PAD, delta_rpm)
+
+
+def depth_axis(min_depth, max_depth, delta_depth):
+    return np.round(np.arange(min_depth, max_depth + DEPTH_PAD, delta_depth), 2)
+
+
+# Array versions of the extrucal `*_cal` functions (unrounded, broadcastable)
+def drag_flow(size, depth, density, rpm=1, pitch=None, w_flight=None, n_flight=1):
+    """
+    Extrusion throughput (Drag Flow) [kg/hr], as in `extrucal.throughput_cal`
+
+    All arguments may be NumPy arrays and are broadcast against each other.
+    """
+    size = np.asarray(size, dtype=float)
+    depth = np.asarray(depth, dtype=float)
+    if pitch is None:
+        pitch = size
+    if w_flight is None:
+        w_flight = size * 0.1
+
+    screw_root_size = size - (depth * 2)
+    helix_angle_b = np.arctan(pitch / (np.pi * size))
+    helix_angle_c = np.arctan(pitch / (np.pi * screw_root_size))
+    channel_width_b = ((pitch / n_flight) * np.cos(helix_angle_b)) - w_flight
+    channel_width_c = ((pitch / n_flight) * np.cos(helix_angle_c)) - w_flight
+    avg_channel_width = (channel_width_b + channel_width_c) / 2
+
+    ratio = (np.pi * depth) / (2 * avg_channel_width)
+    terms = np.tanh(np.multiply.outer(ratio, SHAPE_FACTOR_TERMS)) / (
+        SHAPE_FACTOR_TERMS**3
+    )
+    shape_factor_drag = ((16 * avg_channel_width) / (np.pi**3 * depth)) * terms.sum(
+        axis=-1
+    )
+    barrel_rot_speed = (np.pi * (rpm / 60) * size * np.cos(helix_angle_b)) / 1000
+    throughput_per_sec = (
+        n_flight
+        * density
+        * barrel_rot_speed
+        * (avg_channel_width / 1000)
+        * (depth / 1000)
+        * shape_factor_drag
+    ) / 2
+
+    return throughput_per_sec * 60 * 60
+
+
+def cable_area(outer_d, thickness):
+    """Insulation cross section [m^2], as in `extrucal.cable_cal`"""
+    inner_d = outer_d - (2 * thickness)
+    return np.pi * (((outer_d / 2) ** 2) - ((inner_d / 2) ** 2)) / 1000000
+
+
+def tube_area(outer_d, inner_d):
+    """Tube cross section [m^2], as in `extrucal.tube_cal`"""
+    return np.pi * (((outer_d / 2) ** 2) - ((inner_d / 2) ** 2)) / 1000000
+
+
+def rod_area(outer_d, n_holes=1):
+    """Total cross section of all rods [m^2], as in `extrucal.rod_cal`"""
+    return np.pi * ((outer_d / 2) ** 2) * n_holes / 1000000
+
+
+def sheet_area(width, thickness):
+    """Sheet cross section [m^2], as in `extrucal.sheet_cal`"""
+    return width * thickness / 1000000
+
+
+def required_throughput(area, l_speed, s_density):
+    """Required throughput [kg/hr] for a cross section at a line speed"""
+    return l_speed * area * 60 * s_density
+
+
+# Inverse solutions (closed form, broadcast over products and extruders)
+def unit_drag_flow(depth_percent, density):
+    """
+    Drag flow [kg/hr] of a 1 mm screw at 1 RPM, with a metering depth of
+    `depth_percent` of the screw size
+
+    With the pitch (screw size) and flight width (10% of the size) used by the
+    product calculations, every length of the channel scales with the screw
+    size, so that the drag flow is `unit_drag_flow * rpm * size**3`.
+    """
+    return drag_flow(1.0, depth_percent, density)
+
+
+def max_line_speed(area, s_density, density_ratio, size, max_rpm, depth_percent):
+    """
+    Fastest line speed [m/min] of a product (cross section `area` [m^2]) on an
+    extruder of `size` [mm] running at most at `max_rpm`
+
+    All arguments may be NumPy arrays and are broadcast against each other.
+    """
+    size = np.asarray(size, dtype=float)
+    throughput = (
+        max_rpm * size**3 * unit_drag_flow(depth_percent, s_density * density_ratio)
+    )
+    return throughput / required_throughput(area, 1, s_density)
+
+
+def min_extruder_size(area, s_density, density_ratio, l_speed, max_rpm, depth_percent):
+    """
+    Smallest extruder size [mm] making a product (cross section `area` [m^2])
+    at `l_speed` [m/min] without exceeding `max_rpm`
+
+    All arguments may be NumPy arrays and are broadcast against each other.
+    """
+    per_rpm = max_rpm * unit_drag_flow(depth_percent, s_density * density_ratio)
+    return np.cbrt(required_throughput(area, l_speed, s_density) / per_rpm)
+
+
+# Grids (same DataFrames as the extrucal `*_table` functions)
+def rpm_grid(
+    area,
+    s_density,
+    density_ratio,
+    min_l_speed,
+    max_l_speed,
+    delta_l_speed,
+    min_size,
+    max_size,
+    delta_size,
+    depth_percent,
+    rows=None,
+):
+    """
+    Required screw RPM for every extruder size (rows) and line speed (columns)
+
+    Intermediate values are rounded the same way as in extrucal, so that the
+    result matches the `*_table` functions cell by cell. `rows` is an optional
+    (start, stop) slice of the extruder sizes to evaluate, for a grid computed
+    block by block.
+    """
+    import pandas as pd
+
+    l_speed = speed_axis(min_l_speed, max_l_speed, delta_l_speed)
+    size = size_axis(min_size, max_size, delta_size)
+    if rows is not None:
+        size = size[rows[0] : rows[1]]
+
+    req_throughput = np.round(required_throughput(area, l_speed, s_density), 3)
+    throughput = np.round(
+        drag_flow(size, size * depth_percent, s_density * density_ratio), 2
+    )
+    rpm = np.round(req_throughput[np.newaxis, :] / throughput[:, np.newaxis], 2)
+
+    return pd.DataFrame(
+        rpm,
+        index=[f"{k}mm Ext" for k in size],
+        columns=[f"{l}mpm" for l in l_speed],
+    )
+
+
+def depth_range(size, min_depth=None, max_depth=None, delta_depth=None):
+    """Channel depths of `throughput_grid`, with the defaults of extrucal"""
+    if min_depth is None:
+        min_depth = size * 0.02
+    if max_depth is None:
+        max_depth = size * 0.09
+    if delta_depth is None:
+        delta_depth = size * 0.01
+    return min_depth, max_depth, delta_depth
+
+
+def throughput_grid(
+    size,
+    density,
+    pitch=None,
+    w_flight=None,
+    n_flight=1,
+    min_depth=None,
+    max_depth=None,
+    delta_depth=None,
+    min_rpm=5,
+    max_rpm=50,
+    delta_rpm=5,
+    rows=None,
+):
+    """
+    Vectorized `extrucal.extrusion.throughput_table`
+
+    `rows` is an optional (start, stop) slice of the screw RPMs to evaluate.
+    """
+    import pandas as pd
+
+    check_number("size", size)
+    check_number("density", density)
+    min_depth, max_depth, delta_depth = depth_range(
+        size, min_depth, max_depth, delta_depth
+    )
+    for name, value in [
+        ("min_depth", min_depth),
+        ("max_depth", max_depth),
+        ("delta_depth", delta_depth),
+        ("min_rpm", min_rpm),
+        ("max_rpm", max_rpm),
+        ("delta_rpm", delta_rpm),
+    ]:
+        check_number(name, value)
+    check_integer("n_flight", n_flight)
+    if min_depth < size * 0.01:
+        raise ValueError(
+            "Channel depth is too shallow(<1% of screw size) to be used for extrusion screw"
+        )
+    if max_depth > size * 0.3:
+        raise ValueError(
+            "Channel depth is too deep(>30% of screw size) to be used for extrusion screw"
+        )
+    if delta_depth > max_depth - min_depth:
+        raise ValueError(
+            "'delta_depth' can not be greater than 'max_depth - min_depth'"
+        )
+    check_screw(size, density, pitch, w_flight, n_flight)
+
+    depth = depth_axis(min_depth, max_depth, delta_depth)
+    rpm = rpm_axis(min_rpm, max_rpm, delta_rpm)
+    if rows is not None:
+        rpm = rpm[rows[0] : rows[1]]
+    throughput = np.round(
+        drag_flow(
+            size,
+            depth[np.newaxis, :],
+            density,
+            rpm[:, np.newaxis],
+            pitch,
+            w_flight,
+            n_flight,
+        ),
+        2,
+    )
+
+    return pd.DataFrame(
+        throughput,
+        index=[f"rpm={k}" for k in rpm],
+        columns=[f"depth={d}" for d in depth],
+    )
+
+
+def cable_grid(
+    outer_d,
+    thickness,
+    s_density,
+    density_ratio=0.85,
+    min_l_speed=1,
+    max_l_speed=10,
+    delta_l_speed=1,
+    min_size=20,
+    max_size=100,
+    delta_size=20,
+    depth_percent=0.05,
+    rows=None,
+):
+    """Vectorized `extrucal.cable_extrusion.cable_table`"""
+    check_cable(outer_d, thickness)
+    check_rpm_grid(
+        s_density,
+        density_ratio,
+        min_l_speed,
+        max_l_speed,
+        delta_l_speed,
+        min_size,
+        max_size,
+        delta_size,
+        depth_percent,
+    )
+
+    return rpm_grid(
+        cable_area(outer_d, thickness),
+        s_density,
+        density_ratio,
+        min_l_speed,
+        max_l_speed,
+        delta_l_speed,
+        min_size,
+        max_size,
+        delta_size,
+        depth_percent,
+        rows,
+    )
+
+
+def tube_grid(
+    outer_d,
+    inner_d,
+    s_density,
+    density_ratio=0.85,
+    min_l_speed=1,
+    max_l_speed=10,
+    delta_l_speed=1,
+    min_size=20,
+    max_size=100,
+    delta_size=20,
+    depth_percent=0.05,
+    rows=None,
+):
+    """Vectorized `extrucal.tube_extrusion.tube_table`"""
+    check_tube(outer_d, inner_d)
+    check_rpm_grid(
+        s_density,
+        density_ratio,
+        min_l_speed,
+        max_l_speed,
+        delta_l_speed,
+        min_size,
+        max_size,
+        delta_size,
+        depth_percent,
+    )
+
+    return rpm_grid(
+        tube_area(outer_d, inner_d),
+        s_density,
+        density_ratio,
+        min_l_speed,
+        max_l_speed,
+        delta_l_speed,
+        min_size,
+        max_size,
+        delta_size,
+        depth_percent,
+        rows,
+    )
+
+
+def rod_grid(
+    outer_d,
+    s_density,
+    n_holes=1,
+    density_ratio=0.85,
+    min_l_speed=1,
+    max_l_speed=10,
+    delta_l_speed=1,
+    min_size=20,
+    max_size=100,
+    delta_size=20,
+    depth_percent=0.05,
+    rows=None,
+):
+    """Vectorized `extrucal.rod_extrusion.rod_table`"""
+    check_rod(outer_d, n_holes)
+    check_rpm_grid(
+        s_density,
+        density_ratio,
+        min_l_speed,
+        max_l_speed,
+        delta_l_speed,
+        min_size,
+        max_size,
+        delta_size,
+        depth_percent,
+    )
+
+    return rpm_grid(
+        rod_area(outer_d, n_holes),
+        s_density,
+        density_ratio,
+        min_l_speed,
+        max_l_speed,
+        delta_l_speed,
+        min_size,
+        max_size,
+        delta_size,
+        depth_percent,
+        rows,
+    )
+
+
+def sheet_grid(
+    width,
+    thickness,
+    s_density,
+    density_ratio=0.85,
+    min_l_speed=1,
+    max_l_speed=10,
+    delta_l_speed=1,
+    min_size=20,
+    max_size=100,
+    delta_size=20,
+    depth_percent=0.05,
+    rows=None,
+):
+    """Vectorized `extrucal.sheet_extrusion.sheet_table`"""
+    check_sheet(width, thickness)
+    check_rpm_grid(
+        s_density,
+        density_ratio,
+        min_l_speed,
+        max_l_speed,
+        delta_l_speed,
+        min_size,
+        max_size,
+        delta_size,
+        depth_percent,
+    )
+
+    return rpm_grid(
+        sheet_area(width, thickness),
+        s_density,
+        density_ratio,
+        min_l_speed,
+        max_l_speed,
+        delta_l_speed,
+        min_size,
+        max_size,
+        delta_size,
+        depth_percent,
+        rows,
+    )
+
+
+def surface_grid(
+    density,
+    min_size=20,
+    max_size=200,
+    delta_size=5,
+    min_rpm=5,
+    max_rpm=50,
+    delta_rpm=5,
+    depth_percent=0.05,
+    n_flights=(1,),
+):
+    """
+    Throughput [kg/hr] over screw sizes x screw RPMs (x flight counts), with a
+    metering depth of `depth_percent` of the screw size
+
+    The whole surface is a single broadcast of `drag_flow`.
+
+    Returns
+    -------
+    size, rpm, throughput : numpy.ndarray
+                            screw sizes, screw RPMs and the throughput of each
+                            flight count, size and RPM (in this order of axes)
+    """
+    for name, value in [
+        ("density", density),
+        ("min_size", min_size),
+        ("max_size", max_size),
+        ("delta_size", delta_size),
+        ("min_rpm", min_rpm),
+        ("max_rpm", max_rpm),
+        ("delta_rpm", delta_rpm),
+        ("depth_percent", depth_percent),
+    ]:
+        check_number(name, value)
+    if delta_size > max_size - min_size:
+        raise ValueError("'delta_size' can not be greater than 'max_size - min_size'")
+    if delta_rpm > max_rpm - min_rpm:
+        raise ValueError("'delta_rpm' can not be greater than 'max_rpm - min_rpm'")
+    if depth_percent < 0.01:
+        raise ValueError(
+            "Channel depth is too shallow(<1% of screw size) to be used for extrusion screw"
+        )
+    if depth_percent > 0.3:
+        raise ValueError(
+            "Channel depth is too deep(>30% of screw size) to be used for extrusion screw"
+        )
+    size = size_axis(min_size, max_size, delta_size)
+    for n_flight in n_flights:
+        check_screw(size, density, None, None, n_flight)
+
+    rpm = rpm_axis(min_rpm, max_rpm, delta_rpm)
+    size_ = size[np.newaxis, :, np.newaxis]
+    throughput = drag_flow(
+        size_,
+        size_ * depth_percent,
+        density,
+        rpm[np.newaxis, np.newaxis, :],
+        n_flight=np.array(n_flights)[:, np.newaxis, np.newaxis],
+    )
+    return size, rpm, np.round(throughput, 2)
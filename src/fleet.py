@@ -0,0 +1,251 @@
+"""
+Assignment of products to a fleet of extruders
+
+Each product (one row of an upload, with the columns of the "Batch" tab) is
+checked against every extruder of the fleet (size, maximum screw RPM and
+metering depth ratio) at once: the screw RPM it needs on each extruder is a
+single NumPy broadcast of products x extruders, using the closed form of the
+drag flow (`engine.unit_drag_flow`). Each product goes to the smallest
+extruder able to run it within its RPM limit.
+
+pandas is imported on first use.
+"""
+
+import numpy as np
+
+from batch import EXTRUDER_COLUMNS, PRODUCTS
+from engine import (
+    MAX_SCREW_SIZE,
+    MIN_SCREW_SIZE,
+    cable_area,
+    min_extruder_size,
+    required_throughput,
+    rod_area,
+    sheet_area,
+    tube_area,
+    unit_drag_flow,
+)
+
+# Extruders offered when the tab opens
+DEFAULT_FLEET = [
+    {"name": "E45", "size": 45, "max_rpm": 120, "depth_percent": 0.05},
+    {"name": "E60", "size": 60, "max_rpm": 100, "depth_percent": 0.05},
+    {"name": "E90", "size": 90, "max_rpm": 80, "depth_percent": 0.05},
+    {"name": "E120", "size": 120, "max_rpm": 60, "depth_percent": 0.05},
+    {"name": "E150", "size": 150, "max_rpm": 50, "depth_percent": 0.05},
+]
+
+FLEET_COLUMNS = ["name", "size", "max_rpm", "depth_percent"]
+
+# Cross section of each product and the columns it is computed from
+PRODUCT_AREAS = {
+    "cable": (cable_area, ["outer_d", "thickness"]),
+    "tube": (tube_area, ["outer_d", "inner_d"]),
+    "rod": (rod_area, ["outer_d", "n_holes"]),
+    "sheet": (sheet_area, ["width", "thickness"]),
+}
+
+# Geometry checks of each product, on the columns of its cross section (the
+# checks of the extrucal `*_cal` functions and of `engine.check_*`)
+GEOMETRY_CHECKS = {
+    "cable": lambda outer_d, thickness: [
+        (thickness > outer_d / 2, "Thickness can't be greater than radius")
+    ],
+    "tube": lambda outer_d, inner_d: [
+        (inner_d > outer_d, "'inner_d' can't be greater than 'outer_d'")
+    ],
+    "rod": lambda outer_d, n_holes: [
+        (n_holes != np.round(n_holes), "'n_holes' should be integer")
+    ],
+    "sheet": lambda width, thickness: [],
+}
+
+# Material columns of the products, with their defaults
+MATERIAL_COLUMNS = {"density_ratio": EXTRUDER_COLUMNS["density_ratio"]}
+
+
+class FleetError(ValueError):
+    """Raised for a fleet that can't be used"""
+
+
+def read_fleet(rows):
+    """
+    Arrays of the extruders of a fleet, sorted by size
+
+    Parameters
+    ----------
+    rows : list of dict
+           One extruder per row, with the keys of `FLEET_COLUMNS`
+
+    Returns
+    -------
+    names, size, max_rpm, depth_percent : numpy.ndarray
+    """
+    fleet = []
+    for i, row in enumerate(rows or [], start=1):
+        # Rows just added in the editor
+        if all(row.get(column) in (None, "") for column in FLEET_COLUMNS):
+            continue
+        name = str(row.get("name") or f"Extruder {i}")
+        try:
+            size, max_rpm, depth_percent = (
+                float(row.get(column)) for column in FLEET_COLUMNS[1:]
+            )
+        except (TypeError, ValueError):
+            raise FleetError(f"{name}: size, max_rpm and depth_percent are needed")
+        if not MIN_SCREW_SIZE <= size <= MAX_SCREW_SIZE:
+            raise FleetError(
+                f"{name}: the size should be {MIN_SCREW_SIZE}-{MAX_SCREW_SIZE} mm"
+            )
+        if max_rpm <= 0:
+            raise FleetError(f"{name}: max_rpm should be positive")
+        if not 0.01 <= depth_percent <= 0.3:
+            raise FleetError(f"{name}: depth_percent should be 0.01-0.3")
+        fleet.append((size, name, max_rpm, depth_percent))
+    if not fleet:
+        raise FleetError("The fleet has no extruder")
+    fleet.sort()
+    size, names, max_rpm, depth_percent = zip(*fleet)
+    return (
+        np.array(names, dtype=object),
+        np.array(size),
+        np.array(max_rpm),
+        np.array(depth_percent),
+    )
+
+
+def product_arrays(kind, table):
+    """
+    Cross section, line speed, solid density and density ratio of every
+    product of `table`, with an error message for the invalid ones
+
+    Returns
+    -------
+    area, l_speed, s_density, density_ratio, error : numpy.ndarray
+    """
+    import pandas as pd
+
+    area_of, geometry = PRODUCT_AREAS[kind]
+    _, optional = PRODUCTS[kind]
+    defaults = dict(optional, **MATERIAL_COLUMNS)
+
+    def column(name):
+        values = table[name] if name in table else pd.Series(np.nan, table.index)
+        values = pd.to_numeric(values, errors="coerce")
+        if name in defaults:
+            values = values.fillna(defaults[name])
+        return values.to_numpy(dtype=float)
+
+    columns = {name: column(name) for name in geometry}
+    l_speed, s_density, density_ratio = (
+        column(name) for name in ["l_speed", "s_density", "density_ratio"]
+    )
+    with np.errstate(invalid="ignore"):
+        area = area_of(*columns.values())
+        values = np.column_stack([*columns.values(), l_speed, s_density])
+        checks = GEOMETRY_CHECKS[kind](*columns.values())
+        error = np.select(
+            [
+                ~np.isfinite(values).all(axis=1),
+                (values <= 0).any(axis=1),
+                *[invalid for invalid, _ in checks],
+                ~(area > 0),
+                (s_density < 300) | (s_density > 3000),
+                (density_ratio < 0.5) | (density_ratio > 1),
+            ],
+            [
+                "Missing or non-numeric value",
+                "Values should be positive",
+                *[message for _, message in checks],
+                "The product has no cross section",
+                "Solid density should be 300-3000 kg/m^3",
+                "density_ratio should be 0.5-1",
+            ],
+            default="",
+        )
+    return area, l_speed, s_density, density_ratio, error
+
+
+def assign(kind, table, fleet):
+    """
+    Smallest extruder of `fleet` able to run each product of `table`
+
+    Parameters
+    ----------
+    kind  : str
+            Product of the rows of `table` (a key of `PRODUCTS`)
+    table : pandas.DataFrame
+            One product per row
+    fleet : list of dict
+            Extruders, with the keys of `FLEET_COLUMNS`
+
+    Returns
+    -------
+    assignment : pandas.DataFrame
+                 the rows of `table` with "req_throughput", "extruder",
+                 "req_rpm" (on that extruder), "feasible_extruders",
+                 "min_size" (smallest size of an extruder with the RPM limit
+                 and depth ratio of the assigned one, or of the smallest one
+                 of the fleet) and "error"
+    rpm        : numpy.ndarray
+                 screw RPM required by every product (rows) on every extruder
+                 of the fleet sorted by size (columns)
+    """
+    names, size, max_rpm, depth_percent = read_fleet(fleet)
+    area, l_speed, s_density, density_ratio, error = product_arrays(kind, table)
+    valid = error == ""
+
+    req_throughput = required_throughput(area, l_speed, s_density)
+    # Drag flow of each extruder at 1 RPM, per kg/m^3 of melt density
+    unit = size**3 * unit_drag_flow(depth_percent, 1.0)
+    melt_density = s_density * density_ratio
+    with np.errstate(invalid="ignore", divide="ignore"):
+        rpm = req_throughput[:, np.newaxis] / (
+            melt_density[:, np.newaxis] * unit[np.newaxis, :]
+        )
+    feasible = valid[:, np.newaxis] & (rpm <= max_rpm[np.newaxis, :])
+
+    # Smallest feasible extruder (the fleet is sorted by size), and the least
+    # loaded one among extruders of that size
+    smallest = np.where(feasible, size, np.inf).min(axis=1)
+    load = np.where(feasible & (size == smallest[:, np.newaxis]), rpm / max_rpm, np.inf)
+    best = load.argmin(axis=1)
+    assigned = feasible.any(axis=1)
+    rows = np.arange(len(table))
+
+    reference = np.where(assigned, best, 0)
+    with np.errstate(invalid="ignore"):
+        min_size = min_extruder_size(
+            area,
+            s_density,
+            density_ratio,
+            l_speed,
+            max_rpm[reference],
+            depth_percent[reference],
+        )
+    error = np.where(valid & ~assigned, "No extruder of the fleet is big enough", error)
+
+    assignment = table.assign(
+        req_throughput=np.where(valid, np.round(req_throughput, 3), np.nan),
+        extruder=np.where(assigned, names[best], None),
+        req_rpm=np.where(assigned, np.round(rpm[rows, best], 2), np.nan),
+        feasible_extruders=feasible.sum(axis=1),
+        min_size=np.where(valid, np.round(min_size, 1), np.nan),
+        error=error,
+    )
+    return assignment, rpm
+
+
+def utilization(assignment, fleet):
+    """Number of products assigned to each extruder of `fleet`"""
+    counts = assignment["extruder"].value_counts()
+    names, size, max_rpm, _ = read_fleet(fleet)
+    return [
+        {
+            "extruder": name,
+            "size": s,
+            "max_rpm": r,
+            "products": int(counts.get(name, 0)),
+        }
+        for name, s, r in zip(names, size, max_rpm)
+    ]
@@ -0,0 +1,229 @@
+"""
+Grid-size guardrails for the dashboard callbacks
+
+The range inputs of the tabs are free numbers, so a tiny increment or a huge
+maximum would make a callback build (and render) millions of cells. The cost
+of a request is estimated from its ranges before anything is computed, and a
+`GridPolicy` decides whether it is rejected, clamped or downsampled.
+"""
+
+import math
+import os
+from collections import namedtuple
+
+import numpy as np
+
+GRID_ACTIONS = ("reject", "clamp", "downsample")
+
+# Largest number of cells spelled out in the messages
+MAX_FORMATTED_CELLS = 10**12
+
+# Position of the minimum, maximum and increment of a range in the callback
+# arguments, with the pad added to the maximum when the axis is sampled
+GridRange = namedtuple(
+    "GridRange", ["label", "min_index", "max_index", "delta_index", "pad"]
+)
+
+
+class GridTooLarge(ValueError):
+    """Raised when a requested grid is over the cell budget of the policy"""
+
+
+def axis_length(start, stop, step):
+    """Number of values of `np.arange(start, stop, step)`, without building it"""
+    return max(math.ceil((stop - start) / step), 0)
+
+
+def is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def estimate_cells(params, ranges, factor=1):
+    """
+    Number of cells of the grid requested by `params`
+
+    Parameters
+    ----------
+    params : list
+             Arguments of the callback
+    ranges : list of GridRange
+             Ranges of the grid axes in `params`
+    factor : int
+             Number of cells per point of the ranges (e.g. fixed extra axis)
+
+    Returns
+    -------
+    cells : int or float
+            number of cells, `math.inf` for an unbounded range and None when a
+            range is not numeric (left to the input checks of the grid)
+    """
+    cells = factor
+    for r in ranges:
+        low, high, delta = (
+            params[r.min_index],
+            params[r.max_index],
+            params[r.delta_index],
+        )
+        if not (is_number(low) and is_number(high) and is_number(delta)):
+            return None
+        if delta <= 0 or not math.isfinite(low) or not math.isfinite(high):
+            return math.inf
+        cells *= axis_length(low, high + r.pad, delta)
+    return cells
+
+
+def built_cells(params, ranges, factor=1):
+    """
+    Number of cells of the grid built for `params`, from its sampled axes
+
+    `estimate_cells` can be one value off on an axis because of the rounding
+    of floats; this builds the axes, so it is only used on grids estimated
+    within budget.
+    """
+    cells = factor
+    for r in ranges:
+        low, high, delta = (
+            params[r.min_index],
+            params[r.max_index],
+            params[r.delta_index],
+        )
+        cells *= len(np.arange(low, high + r.pad, delta))
+    return cells
+
+
+class GridPolicy:
+    """
+    Admission control of the grid computations
+
+    Parameters
+    ----------
+    max_cells : int
+                Cell budget of a single grid
+    action    : str
+                What to do with a grid over budget:
+                "reject" (no computation, message to the user),
+                "clamp" (reduce the maxima of the ranges) or
+                "downsample" (increase the increments of the ranges)
+    """
+
+    def __init__(self, max_cells=100_000, action="reject"):
+        if action not in GRID_ACTIONS:
+            raise ValueError(f"'action' should be one of {GRID_ACTIONS}")
+        self.max_cells = max_cells
+        self.action = action
+
+    def apply(self, params, ranges, factor=1):
+        """
+        Checks the grid requested by `params` against the cell budget
+
+        Returns
+        -------
+        params, notice : list, str
+                         arguments to compute with, and a message for the user
+                         ("" when the request is within budget)
+
+        Raises
+        ------
+        GridTooLarge
+            when the grid is over budget and cannot (or must not) be reduced
+        """
+        params = list(params)
+        cells = estimate_cells(params, ranges, factor)
+        if cells is None:
+            return params, ""
+        if cells <= self.max_cells:
+            cells = built_cells(params, ranges, factor)
+            if cells <= self.max_cells:
+                return params, ""
+
+        for r in ranges:
+            if not params[r.delta_index] > 0:
+                raise GridTooLarge(f"The increment of {r.label} should be positive.")
+        if not math.isfinite(cells) or self.action == "reject":
+            raise GridTooLarge(
+                f"The requested grid has {format_cells(cells)} cells, more than "
+                f"the limit of {self.max_cells:,}. Please use larger increments "
+                "or narrower ranges."
+            )
+        if self.action == "clamp":
+            params, notice = self._clamp(params, ranges, factor, cells)
+        else:
+            params, notice = self._downsample(params, ranges, factor, cells)
+        # The grid computed is the one built from the reduced ranges
+        if built_cells(params, ranges, factor) > self.max_cells:
+            raise GridTooLarge(
+                f"The grid can't be reduced to the limit of {self.max_cells:,} cells."
+            )
+        return params, notice
+
+    def _clamp(self, params, ranges, factor, cells):
+        changes = []
+        for i, r in enumerate(ranges):
+            others = factor
+            for other in ranges[i + 1 :]:
+                others *= estimate_cells(params, [other])
+            allowed = max(self.max_cells // max(others, 1), 2)
+            low, high, delta = (
+                params[r.min_index],
+                params[r.max_index],
+                params[r.delta_index],
+            )
+            if axis_length(low, high + r.pad, delta) > allowed:
+                # The axis is sampled up to the maximum plus its pad
+                high = math.floor((low + delta * allowed - r.pad) * 1e6) / 1e6
+                params[r.max_index] = max(high, low)
+                changes.append(f"maximum {r.label} reduced to {params[r.max_index]:g}")
+            if estimate_cells(params, ranges, factor) <= self.max_cells:
+                break
+        return params, self._notice(cells, params, ranges, factor, changes)
+
+    def _downsample(self, params, ranges, factor, cells):
+        original = list(params)
+        # Coarsen the longest axis first, the others only if that is not enough
+        for r in sorted(ranges, key=lambda r: -estimate_cells(params, [r])):
+            scale = estimate_cells(params, ranges, factor) / self.max_cells
+            widest = params[r.max_index] - params[r.min_index]
+            while estimate_cells(params, ranges, factor) > self.max_cells:
+                delta = float(f"{original[r.delta_index] * scale:.3g}")
+                if widest > 0 and delta >= widest:
+                    # An increment over the range would leave a single point
+                    params[r.delta_index] = widest
+                    break
+                params[r.delta_index] = delta
+                scale *= 1.05
+        if estimate_cells(params, ranges, factor) > self.max_cells:
+            raise GridTooLarge(
+                f"The grid can't be reduced to the limit of {self.max_cells:,} cells."
+            )
+        changes = [
+            f"increment of {r.label} increased to {params[r.delta_index]:g}"
+            for r in ranges
+            if params[r.delta_index] != original[r.delta_index]
+        ]
+        return params, self._notice(cells, params, ranges, factor, changes)
+
+    def _notice(self, cells, params, ranges, factor, changes):
+        reduced = format_cells(estimate_cells(params, ranges, factor))
+        return (
+            f"The requested grid has {format_cells(cells)} cells, more than the "
+            f"limit of {self.max_cells:,}: {', '.join(changes)} ({reduced} cells)."
+        )
+
+
+def format_cells(cells):
+    if not math.isfinite(cells):
+        return "an unbounded number of"
+    if cells > MAX_FORMATTED_CELLS:
+        return f"over {MAX_FORMATTED_CELLS:,}"
+    return f"{cells:,}"
+
+
+def from_env(max_cells=100_000, action="reject"):
+    """
+    Creates the grid policy configured by the `EXTRUCAL_GRID_*` variables,
+    with a budget of `max_cells` and an `action` for the variables not set
+    """
+    return GridPolicy(
+        max_cells=int(os.environ.get("EXTRUCAL_GRID_MAX_CELLS", max_cells)),
+        action=os.environ.get("EXTRUCAL_GRID_POLICY", action),
+    )
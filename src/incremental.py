@@ -0,0 +1,88 @@
+"""
+Incremental grids of the product tabs
+
+Exploring a product typically extends one range at a time (a faster line
+speed, a bigger extruder). The cells of a grid are independent of each other,
+so when the inputs of a tab only differ from the ones of its displayed outputs
+by a larger maximum of one range, only the new extruder sizes (rows) or line
+speeds (columns) are computed, and joined to the displayed grid taken from
+the result cache. The callback then sends a Dash `Patch` of its outputs where
+they are JSON (Plotly figure, DataTable columns) instead of replacing them.
+
+pandas is imported on first use.
+"""
+
+from collections import namedtuple
+
+from cache import normalize
+from guardrails import axis_length, is_number
+
+# Range of a grid extended by a larger maximum, with its number of values
+# before and after, and whether the range is the rows or the columns
+Extension = namedtuple("Extension", ["range", "axis", "old", "new"])
+
+
+def range_length(params, r):
+    low, high, delta = params[r.min_index], params[r.max_index], params[r.delta_index]
+    return axis_length(low, high + r.pad, delta)
+
+
+def extension(shown, params, ranges):
+    """
+    Range extended from the inputs `shown` to `params`, None unless they only
+    differ by a larger maximum of one of `ranges` (the last one being the
+    rows of the grid)
+    """
+    if shown is None or len(shown) != len(params):
+        return None
+    changed = [
+        i for i, (a, b) in enumerate(zip(shown, params)) if normalize(a) != normalize(b)
+    ]
+    if len(changed) != 1:
+        return None
+    for i, r in enumerate(ranges):
+        if changed[0] != r.max_index:
+            continue
+        values = [params[j] for j in (r.min_index, r.delta_index)] + [
+            shown[r.max_index],
+            params[r.max_index],
+        ]
+        if not all(is_number(v) for v in values) or params[r.delta_index] <= 0:
+            return None
+        old, new = range_length(shown, r), range_length(params, r)
+        if not 0 < old < new:
+            return None
+        axis = "rows" if i == len(ranges) - 1 else "columns"
+        return Extension(r, axis, old, new)
+    return None
+
+
+def extend_grid(grid, shown, params, ext):
+    """
+    Grid of `params`, from the grid of `shown` and the new rows or columns
+
+    `grid` is a memoized grid function accepting a `rows` slice; the grid of
+    `shown` is expected in its cache, and the grid of `params` is stored
+    there.
+
+    Returns
+    -------
+    table, extra : pandas.DataFrame
+                   grid of `params` and its new rows or columns, None when
+                   the new columns can't be computed on their own
+    """
+    import pandas as pd
+
+    if ext.axis == "rows":
+        extra = grid(*params, rows=(ext.old, ext.new))
+        table = pd.concat([grid(*shown), extra])
+    else:
+        # Grid of the new values only, starting where the displayed ones stop
+        r = ext.range
+        first = params[r.min_index] + ext.old * params[r.delta_index]
+        extra = grid(*[first if i == r.min_index else p for i, p in enumerate(params)])
+        if extra.shape[1] != ext.new - ext.old:
+            return None, None
+        table = pd.concat([grid(*shown), extra], axis=1)
+    grid.prime(table, *params)
+    return table, extra
@@ -0,0 +1,445 @@
+"""
+Prometheus metrics of the dashboard
+
+Every request to `/_dash-update-component` is timed and counted per callback
+(`show_cable`, `page_cable_table`, ...), and the time spent in the callbacks
+is split between the extrucal computation of the grids (`compute` phase) and
+the rendering of the charts and tables (`render` phase). The metrics are
+served at `/metrics` in the Prometheus text format:
+
+    extrucal_callback_duration_seconds_bucket{callback="show_cable",le="0.1"} 12
+    extrucal_callback_phase_seconds_sum{callback="show_cable",phase="compute"} 0.84
+    extrucal_cache_hit_ratio{backend="memory"} 0.62
+    ...
+
+Each process keeps its own metrics. With several gunicorn workers, set
+`EXTRUCAL_METRICS_DIR` to a directory shared by the workers: each one writes
+a snapshot of its metrics there, and `/metrics` adds them up.
+"""
+
+import atexit
+import json
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+from flask import Blueprint, Response, g, has_request_context, request
+
+# Metrics recorded and served at /metrics
+ENABLED = os.environ.get("EXTRUCAL_METRICS", "1") == "1"
+
+# Directory of the snapshots of the workers, None to serve this process only
+METRICS_DIR = os.environ.get("EXTRUCAL_METRICS_DIR") or None
+
+# Shortest interval between two snapshots of a worker [s]
+WRITE_INTERVAL = 1.0
+
+# Upper bounds of the buckets of the latency histograms [s]
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, math.inf)
+
+CALLBACK_PATH = "/_dash-update-component"
+
+
+class Metric:
+    """
+    Values of a metric by label values
+
+    Every value is stored as a list of floats (one for counters and gauges),
+    so that the snapshots of several processes are added up element-wise.
+    """
+
+    type = None
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _update(self, labels, func):
+        key = tuple(str(labels[label]) for label in self.labels)
+        with self._lock:
+            value = self._values.get(key)
+            if value is None:
+                value = self._values[key] = self._zero()
+            func(value)
+
+    def _zero(self):
+        return [0.0]
+
+    def snapshot(self):
+        with self._lock:
+            return {json.dumps(key): list(value) for key, value in self._values.items()}
+
+    def samples(self, values):
+        """Lines of the text format of the (added up) values"""
+        for key, value in sorted(values.items()):
+            yield self.name, label_pairs(self.labels, json.loads(key)), value[0]
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, amount=1, **labels):
+        self._update(labels, lambda value: value.__setitem__(0, value[0] + amount))
+
+    def set(self, total, **labels):
+        """Sets the total counted elsewhere (e.g. by a cache)"""
+        self._update(labels, lambda value: value.__setitem__(0, total))
+
+
+class Gauge(Metric):
+    type = "gauge"
+
+    def inc(self, amount=1, **labels):
+        self._update(labels, lambda value: value.__setitem__(0, value[0] + amount))
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, amount, **labels):
+        self._update(labels, lambda value: value.__setitem__(0, amount))
+
+
+class Histogram(Metric):
+    """Counts of the observations in `BUCKETS`, followed by their sum"""
+
+    type = "histogram"
+
+    def _zero(self):
+        return [0.0] * (len(BUCKETS) + 1)
+
+    def observe(self, amount, **labels):
+        def update(value):
+            for i, bound in enumerate(BUCKETS):
+                if amount <= bound:
+                    value[i] += 1
+            value[-1] += amount
+
+        self._update(labels, update)
+
+    def samples(self, values):
+        for key, value in sorted(values.items()):
+            pairs = label_pairs(self.labels, json.loads(key))
+            for bound, count in zip(BUCKETS, value):
+                le = "+Inf" if math.isinf(bound) else repr(bound)
+                yield f"{self.name}_bucket", pairs + [("le", le)], count
+            yield f"{self.name}_sum", pairs, value[-1]
+            yield f"{self.name}_count", pairs, value[len(BUCKETS) - 1]
+
+
+def label_pairs(names, values):
+    return list(zip(names, values))
+
+
+def escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_sample(name, pairs, value):
+    labels = ",".join(f'{label}="{escape(v)}"' for label, v in pairs)
+    value = int(value) if float(value).is_integer() else value
+    return f"{name}{{{labels}}} {value}" if labels else f"{name} {value}"
+
+
+class Registry:
+    """
+    Metrics of a process, with the collectors updating them before a snapshot
+    """
+
+    def __init__(self):
+        self.metrics = {}
+        self.collectors = []
+        self.derived = []
+        self._written = 0.0
+        self._write_lock = threading.Lock()
+
+    def register(self, metric):
+        self.metrics[metric.name] = metric
+        return metric
+
+    def derive(self, name, help, func):
+        """Registers a gauge computed by `func(values)` from the gathered values"""
+        self.derived.append((name, help, func))
+
+    def collect(self, func):
+        """Registers `func()`, called before each snapshot"""
+        self.collectors.append(func)
+        return func
+
+    def snapshot(self):
+        for func in self.collectors:
+            func()
+        return {name: metric.snapshot() for name, metric in self.metrics.items()}
+
+    def write(self, directory, force=False):
+        """Writes the snapshot of this process to `directory`, at most once a
+        `WRITE_INTERVAL` unless forced"""
+        now = time.monotonic()
+        if not force and now - self._written < WRITE_INTERVAL:
+            return
+        with self._write_lock:
+            self._written = now
+            os.makedirs(directory, exist_ok=True)
+            path = os.path.join(directory, f"{os.getpid()}.json")
+            with open(path + ".tmp", "w") as f:
+                json.dump(self.snapshot(), f)
+            os.replace(path + ".tmp", path)
+
+    def gather(self, directory=None):
+        """
+        Snapshot of this process, or the sum of the snapshots in `directory`
+
+        The gauges of processes that have exited are left out; their counters
+        and histograms are kept, as Prometheus expects them to only increase.
+        """
+        if directory is None:
+            return self.snapshot()
+        self.write(directory, force=True)
+        total = {}
+        for entry in os.scandir(directory):
+            pid, ext = os.path.splitext(entry.name)
+            if ext != ".json":
+                continue
+            try:
+                with open(entry.path) as f:
+                    snapshot = json.load(f)
+            except (OSError, ValueError):
+                continue
+            alive = process_alive(int(pid))
+            for name, values in snapshot.items():
+                metric = self.metrics.get(name)
+                if metric is None or (metric.type == "gauge" and not alive):
+                    continue
+                merged = total.setdefault(name, {})
+                for key, value in values.items():
+                    if key in merged:
+                        merged[key] = [a + b for a, b in zip(merged[key], value)]
+                    else:
+                        merged[key] = value
+        return total
+
+    def render(self, values):
+        """Prometheus text format of gathered values"""
+        lines = []
+        for name, metric in self.metrics.items():
+            lines.append(f"# HELP {name} {metric.help}")
+            lines.append(f"# TYPE {name} {metric.type}")
+            for sample in metric.samples(values.get(name, {})):
+                lines.append(format_sample(*sample))
+        for name, help, func in self.derived:
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} gauge")
+            for sample in func(values):
+                lines.append(format_sample(*sample))
+        return "\n".join(lines) + "\n"
+
+
+def process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+registry = Registry()
+
+callback_duration = registry.register(
+    Histogram(
+        "extrucal_callback_duration_seconds",
+        "Time to answer a callback request",
+        ["callback"],
+    )
+)
+callback_requests = registry.register(
+    Counter(
+        "extrucal_callback_requests_total",
+        "Callback requests by HTTP status (204 when no update)",
+        ["callback", "status"],
+    )
+)
+callback_errors = registry.register(
+    Counter(
+        "extrucal_callback_errors_total",
+        "Callback requests failing with a server error",
+        ["callback"],
+    )
+)
+callback_bytes = registry.register(
+    Counter(
+        "extrucal_callback_response_bytes_total",
+        "Size of the responses to callback requests",
+        ["callback"],
+    )
+)
+callback_in_flight = registry.register(
+    Gauge(
+        "extrucal_callback_in_flight",
+        "Callback requests being answered",
+        ["callback"],
+    )
+)
+phase_duration = registry.register(
+    Histogram(
+        "extrucal_callback_phase_seconds",
+        "Time spent computing the grids (compute) or rendering the charts and "
+        "tables (render) of a callback",
+        ["callback", "phase"],
+    )
+)
+cache_hits = registry.register(
+    Counter("extrucal_cache_hits_total", "Lookups found in the cache", ["backend"])
+)
+cache_misses = registry.register(
+    Counter("extrucal_cache_misses_total", "Lookups missed by the cache", ["backend"])
+)
+cache_entries = registry.register(
+    Gauge("extrucal_cache_entries", "Results stored in the cache", ["backend"])
+)
+
+
+def hit_ratio(values):
+    hits = values.get(cache_hits.name, {})
+    misses = values.get(cache_misses.name, {})
+    for key, (hit,) in sorted(hits.items()):
+        lookups = hit + misses.get(key, [0])[0]
+        pairs = label_pairs(cache_hits.labels, json.loads(key))
+        yield "extrucal_cache_hit_ratio", pairs, hit / lookups if lookups else 0.0
+
+
+registry.derive(
+    "extrucal_cache_hit_ratio", "Share of the cache lookups found", hit_ratio
+)
+
+
+def current_callback():
+    """Callback (or Flask endpoint) of the request being answered"""
+    return g.get("callback") or request.endpoint or "none"
+
+
+@contextmanager
+def phase(name):
+    """
+    Records the time spent in a phase of the current callback
+
+    Phases outside of a request (pre-rendering at startup) aren't recorded.
+    """
+    if not has_request_context():
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        phase_duration.observe(
+            time.perf_counter() - start, callback=current_callback(), phase=name
+        )
+
+
+def timed(name):
+    """Decorator recording the time spent in a function as a phase"""
+
+    def decorator(func):
+        if not ENABLED:
+            return func
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with phase(name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def watch_cache(cache):
+    """Reports the hits, misses and size of a `cache` backend"""
+
+    @registry.collect
+    def collect():
+        stats = cache.stats()
+        # Tiered caches report the stats of each of their backends
+        if "hits" in stats:
+            stats = {cache.name: stats}
+        for backend, values in stats.items():
+            cache_hits.set(values["hits"], backend=backend)
+            cache_misses.set(values["misses"], backend=backend)
+            if "entries" in values:
+                cache_entries.set(values["entries"], backend=backend)
+
+
+def callback_name(app, payload):
+    """Name of the function of a Dash callback request"""
+    output = (payload or {}).get("output")
+    callback = app.callback_map.get(output, {}).get("callback")
+    return getattr(callback, "__name__", None) or "unknown"
+
+
+def instrument(app):
+    """
+    Times and counts the callback requests of a Dash app, and serves the
+    metrics at /metrics on its server
+    """
+    if not ENABLED:
+        return
+    server = app.server
+
+    @server.before_request
+    def start():
+        if request.path != CALLBACK_PATH:
+            return
+        g.callback = callback_name(app, request.get_json(silent=True))
+        g.callback_start = time.perf_counter()
+        callback_in_flight.inc(callback=g.callback)
+
+    @server.after_request
+    def record(response):
+        if "callback_start" not in g:
+            return response
+        callback = g.callback
+        callback_duration.observe(
+            time.perf_counter() - g.callback_start, callback=callback
+        )
+        callback_requests.inc(callback=callback, status=response.status_code)
+        if response.status_code >= 500:
+            callback_errors.inc(callback=callback)
+        callback_bytes.inc(response.calculate_content_length() or 0, callback=callback)
+        g.callback_recorded = True
+        return response
+
+    @server.teardown_request
+    def finish(error):
+        if "callback_start" not in g:
+            return
+        callback_in_flight.dec(callback=g.callback)
+        if not g.get("callback_recorded"):
+            # The exception escaped the error handlers
+            callback_errors.inc(callback=g.callback)
+        if METRICS_DIR:
+            registry.write(METRICS_DIR)
+
+    server.register_blueprint(create_metrics())
+    if METRICS_DIR:
+        atexit.register(registry.write, METRICS_DIR, True)
+
+
+def create_metrics():
+    """Blueprint serving the metrics in the Prometheus text format"""
+    blueprint = Blueprint("metrics", __name__)
+
+    @blueprint.get("/metrics")
+    def metrics():
+        return Response(
+            registry.render(registry.gather(METRICS_DIR)),
+            mimetype="text/plain; version=0.0.4",
+        )
+
+    return blueprint
@@ -0,0 +1,169 @@
+"""
+On-demand profiling of the tab callbacks
+
+A profiled call of a `show_*` callback writes three files to
+`EXTRUCAL_PROFILE_DIR`, named after the callback, the time and a digest of its
+inputs:
+
+    show_sheet-20261018-101502-3f2a9c1b.pstats     cProfile statistics
+    show_sheet-20261018-101502-3f2a9c1b.collapsed  sampled stacks ("a;b;c 12")
+    show_sheet-20261018-101502-3f2a9c1b.json       inputs and elapsed time
+
+The `.pstats` file opens with `python -m pstats` or snakeviz, and the
+`.collapsed` file is the input of flamegraph.pl or speedscope.
+
+Calls are profiled when `EXTRUCAL_PROFILE=1`, or when a request carries the
+header `X-Extrucal-Profile` with the value of `EXTRUCAL_PROFILE_TOKEN`. When
+neither is set, the callbacks aren't wrapped at all.
+"""
+
+import cProfile
+import hashlib
+import hmac
+import inspect
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from functools import wraps
+
+from flask import has_request_context, request
+
+# Profile every call of the callbacks
+PROFILE_ALL = os.environ.get("EXTRUCAL_PROFILE", "0") == "1"
+
+# Secret of the header requesting the profile of a single request
+PROFILE_TOKEN = os.environ.get("EXTRUCAL_PROFILE_TOKEN") or None
+PROFILE_HEADER = "X-Extrucal-Profile"
+
+PROFILE_DIR = os.environ.get(
+    "EXTRUCAL_PROFILE_DIR", os.path.join(tempfile.gettempdir(), "extrucal_profiles")
+)
+
+# Interval between two samples of the stack of a profiled call [s]
+SAMPLE_INTERVAL = float(os.environ.get("EXTRUCAL_PROFILE_INTERVAL", 0.005))
+
+# Only one thread at a time can run cProfile (sys.monitoring in Python 3.12+);
+# other profiled calls only get sampled stacks
+_cprofile_lock = threading.Lock()
+
+
+def requested():
+    """True when the call being made should be profiled"""
+    if PROFILE_ALL:
+        return True
+    if PROFILE_TOKEN is None or not has_request_context():
+        return False
+    header = request.headers.get(PROFILE_HEADER)
+    return header is not None and hmac.compare_digest(header, PROFILE_TOKEN)
+
+
+class StackSampler(threading.Thread):
+    """
+    Samples the stack of a thread below a frame, in the collapsed format of
+    flamegraph.pl
+    """
+
+    def __init__(self, thread_id, root, interval=SAMPLE_INTERVAL):
+        super().__init__(daemon=True)
+        self.thread_id = thread_id
+        self.root = root
+        self.interval = interval
+        self.stacks = Counter()
+        self._done = threading.Event()
+
+    def run(self):
+        while not self._done.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None and frame is not self.root:
+                code = frame.f_code
+                stack.append(
+                    f"{code.co_name} ({os.path.basename(code.co_filename)}:"
+                    f"{code.co_firstlineno})"
+                )
+                frame = frame.f_back
+            # Samples taken after the call returned (while stopping) are dropped
+            if frame is self.root and stack and not self._done.is_set():
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def stop(self):
+        self._done.set()
+        self.join()
+
+    def collapsed(self):
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.items())
+
+
+def label(name, arguments):
+    """File name (without extension) of a profile"""
+    digest = hashlib.sha1(
+        json.dumps(arguments, sort_keys=True, default=repr).encode()
+    ).hexdigest()[:8]
+    return f"{name}-{datetime.now():%Y%m%d-%H%M%S}-{digest}"
+
+
+def write_profile(name, arguments, elapsed, profile, sampler):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    path = os.path.join(PROFILE_DIR, label(name, arguments))
+    if profile is not None:
+        profile.dump_stats(path + ".pstats")
+    with open(path + ".collapsed", "w") as f:
+        f.write(sampler.collapsed())
+    with open(path + ".json", "w") as f:
+        json.dump(
+            {
+                "callback": name,
+                "arguments": arguments,
+                "elapsed": elapsed,
+                "samples": sum(sampler.stacks.values()),
+                "pstats": profile is not None,
+            },
+            f,
+            indent=2,
+            default=repr,
+        )
+    return path
+
+
+def profiled(func):
+    """
+    Profiles the calls of a callback when requested
+
+    The callback is returned as is when profiling is disabled, so that it
+    costs nothing.
+    """
+    if not PROFILE_ALL and PROFILE_TOKEN is None:
+        return func
+    signature = inspect.signature(func)
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        if not requested():
+            return func(*args, **kwargs)
+
+        bound = signature.bind_partial(*args, **kwargs)
+        arguments = dict(bound.arguments)
+        sampler = StackSampler(threading.get_ident(), sys._getframe())
+        profile = cProfile.Profile() if _cprofile_lock.acquire(False) else None
+        sampler.start()
+        start = time.perf_counter()
+        try:
+            if profile is None:
+                return func(*args, **kwargs)
+            return profile.runcall(func, *args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - start
+            sampler.stop()
+            if profile is not None:
+                _cprofile_lock.release()
+            path = write_profile(func.__name__, arguments, elapsed, profile, sampler)
+            print(
+                f"profile: {func.__name__} in {elapsed:.3f}s -> {path}", file=sys.stderr
+            )
+
+    return wrapper
@@ -0,0 +1,265 @@
+"""
+Startup-time report and import-time budget of the dashboard
+
+`timer` records the time spent importing the app, and `report` prints it at
+boot with the pre-rendering time of each tab, followed by the import cost of
+each package once `report_imports` has measured it:
+
+    startup: app ready in 2.03s (imports 1.08s, pre-render 0.95s)
+    startup:   pre-render throughput       0.647s
+    ...
+    startup:   import pandas (first use)   0.227s
+    startup:   import dash                 0.135s
+    ...
+
+pandas, Altair, extrucal and pretty_html_table are imported by the functions
+that use them, so they are only loaded on the first computation.
+
+The cost of each package comes from an `ImportProbe`: a process importing the
+app without pre-rendering, then the lazy modules, under `python -X importtime`.
+The app starts it at a low priority once it is ready, so its own imports are
+never traced and neither the pre-rendering nor the first requests wait for
+it. `python startup.py` prints the costs of a probe; with `--check`, it fails
+when the import takes longer than the budget or loads one of the lazy
+modules.
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+
+# Import-time budget of the app without pre-rendering [s]: the import takes
+# about 1.1s once the heavy modules are lazy (2.0s before), plus a margin
+IMPORT_BUDGET = float(os.environ.get("EXTRUCAL_IMPORT_BUDGET", 1.5))
+
+# Modules that must not be loaded by `import app` alone
+LAZY_MODULES = ["pandas", "altair", "extrucal", "pretty_html_table"]
+
+# Packages listed in the startup report
+REPORT_TOP = 10
+
+# Longest wait for the import costs in the startup report [s], and the
+# niceness of the probe measuring them
+PROBE_TIMEOUT = 60
+PROBE_NICENESS = 10
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+PROBE = f"""
+import importlib, json, os, sys, time
+if hasattr(os, "nice"):
+    os.nice(int(sys.argv[1]))
+start = time.perf_counter()
+import app
+elapsed = time.perf_counter() - start
+loaded = [m for m in {LAZY_MODULES!r} if m in sys.modules]
+for module in {LAZY_MODULES!r}:
+    importlib.import_module(module)
+print(json.dumps([elapsed, loaded]))
+"""
+
+
+class ImportTimer:
+    """Records the time spent importing the app"""
+
+    def __init__(self):
+        self.started = None
+        self.stopped = None
+
+    def start(self):
+        self.started = time.perf_counter()
+
+    def stop(self):
+        self.stopped = time.perf_counter()
+
+    def total(self):
+        return (self.stopped or time.perf_counter()) - self.started
+
+
+timer = ImportTimer()
+
+
+class ImportProbe:
+    """
+    Process importing the app without pre-rendering, then the lazy modules,
+    under `python -X importtime`, with a `niceness` increment
+    """
+
+    def __init__(self, niceness=0):
+        env = dict(os.environ, EXTRUCAL_PRERENDER="0", EXTRUCAL_STARTUP_REPORT="0")
+        self._process = subprocess.Popen(
+            [sys.executable, "-X", "importtime", "-c", PROBE, str(niceness)],
+            cwd=HERE,
+            env=env,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+        )
+
+    def result(self, timeout=None):
+        """
+        Waits for the probe
+
+        Returns
+        -------
+        elapsed, costs, loaded : float, dict, list of str
+                                 import time of the app [s], import cost of
+                                 each top-level package, the lazy modules
+                                 included [s], and the lazy modules loaded by
+                                 the app
+        """
+        try:
+            stdout, stderr = self._process.communicate(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            self._process.kill()
+            self._process.communicate()
+            raise
+        if self._process.returncode:
+            lines = stderr.strip().splitlines()
+            raise RuntimeError(lines[-1] if lines else "import probe failed")
+        elapsed, loaded = json.loads(stdout.splitlines()[-1])
+        return elapsed, import_costs(stderr), loaded
+
+
+def import_costs(output):
+    """
+    Import cost of each top-level package [s], from the output of `python -X
+    importtime` (the self time of its modules, which add up to the total)
+    """
+    costs = {}
+    for line in output.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        fields = line[len("import time:") :].split("|")
+        try:
+            self_time = int(fields[0])
+        except ValueError:
+            # Header of the output
+            continue
+        package = fields[2].strip().partition(".")[0]
+        costs[package] = costs.get(package, 0.0) + self_time / 1e6
+    return costs
+
+
+def cost_lines(costs):
+    """Most costly packages, the lazy ones marked as loaded on first use"""
+    top = sorted(costs.items(), key=lambda item: -item[1])[:REPORT_TOP]
+    return [
+        f"import {package + (' (first use)' if package in LAZY_MODULES else ''):<21}"
+        f"{cost:.3f}s"
+        for package, cost in top
+    ]
+
+
+def report(prerender=None, file=None):
+    """
+    Prints the boot time and the pre-rendering time of each tab
+
+    Parameters
+    ----------
+    prerender : dict
+                Pre-rendering time of each tab [s], None if not pre-rendered
+    file      : file
+                Destination of the report (stderr by default)
+    """
+    file = file or sys.stderr
+    prerender = prerender or {}
+    ready = time.perf_counter() - timer.started
+    print(
+        f"startup: app ready in {ready:.2f}s (imports {timer.total():.2f}s, "
+        f"pre-render {sum(prerender.values()):.2f}s)",
+        file=file,
+    )
+    for tab, elapsed in prerender.items():
+        print(f"startup:   pre-render {tab:<17}{elapsed:.3f}s", file=file)
+    file.flush()
+
+
+def report_imports(file=None):
+    """
+    Prints the import cost of each package in the background, once measured
+    by a low-priority `ImportProbe`
+
+    Returns
+    -------
+    thread : threading.Thread
+             daemon thread waiting for the probe
+    """
+    file = file or sys.stderr
+    probe = ImportProbe(PROBE_NICENESS)
+
+    def wait():
+        try:
+            _, costs, _ = probe.result(PROBE_TIMEOUT)
+            lines = cost_lines(costs)
+        except (OSError, ValueError, RuntimeError, subprocess.SubprocessError) as e:
+            lines = [f"import costs unavailable ({e})"]
+        print("\n".join(f"startup:   {line}" for line in lines), file=file)
+        file.flush()
+
+    thread = threading.Thread(target=wait, name="import-probe", daemon=True)
+    thread.start()
+    return thread
+
+
+def measure(runs=3):
+    """
+    Runs `runs` import probes
+
+    Returns
+    -------
+    elapsed, costs, loaded : float, dict, list of str
+                             result of the fastest probe (see
+                             `ImportProbe.result`)
+    """
+    results = [ImportProbe().result() for _ in range(runs)]
+    # The fastest run is the least affected by the noise of the machine
+    return min(results, key=lambda result: result[0])
+
+
+def check(budget=IMPORT_BUDGET, runs=3):
+    """
+    Checks the import time of the app against `budget`, and that the lazy
+    modules aren't loaded at import
+
+    Returns
+    -------
+    errors : list of str
+             budget or lazy-import violations, empty when the check passes
+    """
+    elapsed, costs, loaded = measure(runs)
+    print_costs(elapsed, costs)
+    print(f"import app: {elapsed:.2f}s (budget {budget:.2f}s)")
+    errors = []
+    if elapsed > budget:
+        errors.append(f"importing the app took {elapsed:.2f}s, over {budget:.2f}s")
+    if loaded:
+        errors.append(f"modules loaded at import instead of first use: {loaded}")
+    return errors
+
+
+def print_costs(elapsed, costs):
+    print(f"import app: {elapsed:.2f}s")
+    for line in cost_lines(costs):
+        print(f"  {line}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--check", action="store_true", help="check the import-time budget"
+    )
+    parser.add_argument("--budget", type=float, default=IMPORT_BUDGET)
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    if args.check:
+        errors = check(args.budget, args.runs)
+        for error in errors:
+            print(f"FAILED: {error}", file=sys.stderr)
+        sys.exit(1 if errors else 0)
+    print_costs(*measure(args.runs)[:2])
@@ -0,0 +1,124 @@
+"""
+Tables of the dashboard, built from the grids computed by `engine`
+
+Each table can be rendered in two modes:
+
+- "html": styled HTML document (pretty_html_table) for an `html.Iframe` srcDoc
+- "datatable": `dash_table.DataTable` paged and sorted on the server, so only
+  the visible window of a large grid is sent to the browser
+
+pandas and pretty_html_table are imported on first use.
+"""
+
+import math
+
+from dash import dash_table
+
+TABLE_MODES = ("html", "datatable")
+
+# Rows sent to the browser per DataTable page
+PAGE_SIZE = 50
+
+# Column holding the row labels of the grid
+INDEX_COLUMN = "index"
+
+FONT = "Century Gothic, sans-serif"
+
+
+def html_table(table):
+    from pretty_html_table import build_table
+
+    return build_table(
+        table,
+        "grey_light",
+        font_size="16px",
+        index=True,
+        text_align="center",
+        padding="5px",
+    )
+
+
+def datatable(id, page_size=PAGE_SIZE):
+    """Empty DataTable filled page by page by `datatable_page`"""
+    return dash_table.DataTable(
+        id=id,
+        page_current=0,
+        page_size=page_size,
+        page_action="custom",
+        sort_action="custom",
+        sort_mode="multi",
+        sort_by=[],
+        fixed_rows={"headers": True},
+        fixed_columns={"headers": True, "data": 1},
+        style_table={"overflowX": "auto", "minWidth": "100%", "height": "600px"},
+        style_header={
+            "backgroundColor": "#FFFFFF",
+            "color": "#808080",
+            "fontWeight": "bold",
+            "borderBottom": "2px solid #808080",
+        },
+        style_cell={
+            "fontFamily": FONT,
+            "fontSize": "16px",
+            "textAlign": "center",
+            "padding": "5px",
+            "minWidth": "90px",
+        },
+    )
+
+
+def datatable_page(table, page_current, page_size, sort_by):
+    """
+    Columns, rows and page count of one page of a grid for a DataTable
+
+    Parameters
+    ----------
+    table        : pandas.DataFrame
+                   grid returned by one of the `*_grid` functions
+    page_current : int
+                   Index of the requested page (clamped to the last page)
+    page_size    : int
+                   Number of rows per page
+    sort_by      : list of dict
+                   DataTable sort specification ({"column_id", "direction"}),
+                   sent by the browser: unknown columns are ignored
+
+    Returns
+    -------
+    columns, data, page_count : list of dict, list of dict, int
+    """
+    import pandas as pd
+
+    page_size = page_size or PAGE_SIZE
+    page_count = max(math.ceil(len(table) / page_size), 1)
+    page_current = min(page_current or 0, page_count - 1)
+
+    rows = table.reset_index(names=INDEX_COLUMN)
+    # Column ids of the DataTable are the column names as text
+    ids = {str(c): c for c in rows.columns}
+    sort_by = [
+        s
+        for s in sort_by or []
+        if isinstance(s, dict)
+        and isinstance(s.get("column_id"), str)
+        and s["column_id"] in ids
+    ]
+    if sort_by:
+        rows = rows.sort_values(
+            [ids[s["column_id"]] for s in sort_by],
+            ascending=[s.get("direction") != "desc" for s in sort_by],
+            # Row labels ("40.0mm Ext", "rpm=5.0") sort in grid order, not as text
+            key=lambda col: (
+                pd.Series(range(len(col)), index=col.index)
+                if col.name == INDEX_COLUMN
+                else col
+            ),
+            kind="stable",
+        )
+    start = page_current * page_size
+    data = rows.iloc[start : start + page_size].to_dict("records")
+
+    columns = [{"name": "", "id": INDEX_COLUMN}] + [
+        {"name": str(c), "id": str(c), "type": "numeric"} for c in table.columns
+    ]
+    return columns, data, page_count
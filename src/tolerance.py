@@ -0,0 +1,141 @@
+"""
+Monte Carlo tolerance analysis of the required screw RPM
+
+The solid density, the melt/solid density ratio and the metering depth ratio
+of a product tab are drawn from distributions around their nominal values
+(tens of thousands of draws), and the screw RPM required at a line speed is
+evaluated for all the draws at once with NumPy. The percentiles of the draws
+give bands of required RPM over the extruder sizes of the tab.
+
+With the screw geometry of the product calculations, the required RPM is
+
+    rpm = required_throughput / (melt_density * unit_drag_flow * size**3)
+
+so the draws are evaluated once, for a 1 mm extruder, and the percentiles are
+scaled by size**-3 (the same for every draw) instead of evaluating every draw
+on every size. The solid density cancels out of the RPM: it scales the
+required throughput and the melt density alike, and only changes the
+throughput percentiles.
+
+pandas is imported on first use.
+"""
+
+import os
+
+import numpy as np
+
+from engine import check_depth, check_material, required_throughput, unit_drag_flow
+
+PERCENTILES = (5, 25, 50, 75, 95)
+
+DISTRIBUTIONS = ("normal", "uniform", "triangular")
+
+# Maximum number of draws of an analysis
+MAX_DRAWS = int(os.environ.get("EXTRUCAL_TOLERANCE_MAX_DRAWS", 200_000))
+
+# Seed of the draws, so that the same inputs give the same bands
+SEED = 0
+
+# Valid range of the sampled inputs, where their draws are clipped
+BOUNDS = {
+    "s_density": (300, 3000),
+    "density_ratio": (0.5, 1),
+    "depth_percent": (0.01, 0.3),
+}
+
+
+class ToleranceError(ValueError):
+    """Raised for an analysis that can't be run"""
+
+
+def sample(rng, name, nominal, tolerance, distribution, draws):
+    """
+    Draws of an input around its nominal value
+
+    `tolerance` is the standard deviation of a "normal" distribution and the
+    half-width of a "uniform" or "triangular" one.
+    """
+    if tolerance == 0:
+        return np.full(draws, float(nominal))
+    if distribution == "normal":
+        values = rng.normal(nominal, tolerance, draws)
+    elif distribution == "uniform":
+        values = rng.uniform(nominal - tolerance, nominal + tolerance, draws)
+    elif distribution == "triangular":
+        values = rng.triangular(
+            nominal - tolerance, nominal, nominal + tolerance, draws
+        )
+    else:
+        raise ToleranceError(f"Unknown distribution '{distribution}'")
+    return np.clip(values, *BOUNDS[name])
+
+
+def rpm_bands(
+    area,
+    l_speed,
+    sizes,
+    nominal,
+    tolerances,
+    distribution="normal",
+    draws=20_000,
+    seed=SEED,
+):
+    """
+    Percentiles of the screw RPM required by a product on each extruder size
+
+    Parameters
+    ----------
+    area         : float
+                   Cross section of the product [m^2]
+    l_speed      : float
+                   Line speed [m/min]
+    sizes        : numpy.ndarray
+                   Extruder sizes [mm]
+    nominal      : dict
+                   Nominal "s_density", "density_ratio" and "depth_percent"
+    tolerances   : dict
+                   Tolerance of each of them (0 to keep it fixed)
+    distribution : str
+                   One of `DISTRIBUTIONS`
+    draws        : int
+                   Number of draws (an integral float is accepted)
+
+    Returns
+    -------
+    bands      : pandas.DataFrame
+                 "size" and one "p<q>" column per percentile of `PERCENTILES`
+    throughput : dict
+                 percentiles of the required throughput [kg/hr]
+    """
+    import pandas as pd
+
+    if not float(draws).is_integer() or not 1 <= draws <= MAX_DRAWS:
+        raise ToleranceError(
+            f"The number of draws should be a whole number of 1-{MAX_DRAWS:,}"
+        )
+    draws = int(draws)
+    # The nominal values are checked like the inputs of the RPM grids; only
+    # their draws are clipped to `BOUNDS`
+    try:
+        check_material(nominal["s_density"], nominal["density_ratio"])
+        check_depth(nominal["depth_percent"])
+    except ValueError as e:
+        raise ToleranceError(str(e))
+    rng = np.random.default_rng(seed)
+    s_density, density_ratio, depth_percent = (
+        sample(rng, name, nominal[name], tolerances[name], distribution, draws)
+        for name in ["s_density", "density_ratio", "depth_percent"]
+    )
+
+    throughput = required_throughput(area, l_speed, s_density)
+    # RPM of every draw on a 1 mm extruder
+    rpm = throughput / (s_density * density_ratio * unit_drag_flow(depth_percent, 1.0))
+
+    sizes = np.asarray(sizes, dtype=float)
+    rpm_percentiles = np.percentile(rpm, PERCENTILES)
+    bands = pd.DataFrame(
+        np.round(rpm_percentiles[np.newaxis, :] / sizes[:, np.newaxis] ** 3, 2),
+        columns=[f"p{q}" for q in PERCENTILES],
+    )
+    bands.insert(0, "size", sizes)
+    return bands, dict(zip(PERCENTILES, np.percentile(throughput, PERCENTILES)))